@@ -3,6 +3,8 @@ import pandas as pd
 from datetime import datetime
 import os
 
+import almacen
+
 # Lista de símbolos de las empresas del IBEX 35
 symbols_ibex = [
     'ACX.MC', 'ACS.MC', 'AENA.MC', 'ALM.MC', 'AMS.MC', 'MT.AS', 'BBVA.MC', 'SAB.MC', 'SAN.MC',
@@ -48,3 +50,11 @@ for ibex_symbol in symbols_ibex:
     ibex_data.to_excel(output_file)
 
     print(f"Datos de '{ibex_symbol}' descargados y guardados en '{output_file}'")
+
+    # Registrar en el histórico versionado solo las barras nuevas o revisadas
+    try:
+        cambios = almacen.registrar(ibex_symbol, ibex_data, current_date)
+        print(f"Histórico de '{ibex_symbol}': {cambios['nuevas']} barras nuevas, "
+              f"{cambios['revisadas']} revisadas, {cambios['borradas']} borradas")
+    except Exception as e:
+        print(f"Error al registrar '{ibex_symbol}' en el histórico: {e}")
@@ -1,15 +1,16 @@
 import os
 from datetime import datetime
 
+import manifiesto
+
 def listar_archivos(directorio):
-    # Verificar que el directorio existe
-    if not os.path.exists(directorio):
-        raise FileNotFoundError(f"El directorio {directorio} no existe.")
+    # Actualizar el manifiesto del día (solo se leen los archivos nuevos o modificados);
+    # lanza FileNotFoundError si el directorio no existe
+    datos, descritos = manifiesto.actualizar(directorio)
+    print(f"Manifiesto actualizado: {descritos} archivos nuevos o modificados")
     
-    # Listar los archivos en el directorio
-    archivos = os.listdir(directorio)
-    # Generar las rutas completas de los archivos
-    rutas_completas = [os.path.join(directorio, archivo) for archivo in archivos]
+    # Rutas completas de los archivos, de mayor a menor tamaño
+    rutas_completas = manifiesto.rutas(datos)
     
     return rutas_completas
 
@@ -3,6 +3,24 @@ import pandas as pd
 from openpyxl import load_workbook
 from datetime import datetime
 
+import cache_resultados
+import manifiesto
+
+
+def ya_normalizado(excel_file):
+    """
+    True si la hoja Sheet1 ya es la salida de esta etapa: la descarga en bruto de yfinance
+    empieza por la fila Price (seguida de Ticker y Date) y la limpia tiene 'Date' en A1.
+    """
+    workbook = load_workbook(excel_file, read_only=True)
+    try:
+        if 'Sheet1' not in workbook.sheetnames:
+            return False
+        primera_fila = next(workbook['Sheet1'].iter_rows(min_row=1, max_row=1, max_col=1, values_only=True), (None,))
+        return primera_fila[0] == 'Date'
+    finally:
+        workbook.close()
+
 # Obtener la fecha actual
 current_date = datetime.now().strftime("%Y%m%d")
 
@@ -17,22 +35,43 @@ else:
     with open(lista_file, 'r') as file:
         file_paths = [line.strip() for line in file if line.strip()]
 
+    # Versión del código para la caché: cambiar la limpieza invalida los resultados guardados
+    version = cache_resultados.version_codigo(__file__)
+
     # Procesar cada archivo Excel
     for excel_file in file_paths:
         try:
-            # Leer el archivo Excel SIN interpretar encabezado
-            df = pd.read_excel(excel_file, sheet_name='Sheet1', header=None)
+            # Los ficheros que ya son la salida de esta etapa no se vuelven a limpiar
+            # (se eliminarían otras tres filas de datos). La marca de la caché solo evita
+            # abrir el libro: si se ha purgado, se comprueba el contenido de la hoja
+            hash_entrada = manifiesto.hash_archivo(excel_file)
+            marca = cache_resultados.clave('ohlcv_archivo', hash_entrada, version)
+            if cache_resultados.obtener('ohlcv_archivo', marca) is not None:
+                print(f"✅ '{excel_file}' ya está normalizado.")
+                continue
+            if ya_normalizado(excel_file):
+                cache_resultados.guardar('ohlcv_archivo', marca, True)
+                print(f"✅ '{excel_file}' ya está normalizado.")
+                continue
+
+            # Reutilizar la limpieza guardada si el fichero descargado es idéntico
+            clave = cache_resultados.clave('ohlcv', hash_entrada, version)
+            df = cache_resultados.obtener('ohlcv', clave)
+            if df is None:
+                # Leer el archivo Excel SIN interpretar encabezado
+                df = pd.read_excel(excel_file, sheet_name='Sheet1', header=None)
 
-            print(f"🔎 Primeras filas de '{excel_file}' antes de eliminar:\n", df.head(10))
+                print(f"🔎 Primeras filas de '{excel_file}' antes de eliminar:\n", df.head(10))
 
-            # Asignar la primera fila como encabezado
-            df.columns = df.iloc[0]  # Primera fila como encabezado
-            df = df.drop(index=0)    # Eliminar la fila del encabezado antiguo
+                # Asignar la primera fila como encabezado
+                df.columns = df.iloc[0]  # Primera fila como encabezado
+                df = df.drop(index=0)    # Eliminar la fila del encabezado antiguo
 
-            # Eliminar filas 2, 3 y 4 (sin contar encabezado)
-            df = df.drop(index=[1, 2, 3], errors='ignore').reset_index(drop=True)
+                # Eliminar filas 2, 3 y 4 (sin contar encabezado)
+                df = df.drop(index=[1, 2, 3], errors='ignore').reset_index(drop=True)
 
-            print(f"✅ Primeras filas después de la limpieza:\n", df.head(10))
+                print(f"✅ Primeras filas después de la limpieza:\n", df.head(10))
+                cache_resultados.guardar('ohlcv', clave, df)
 
             # Guardar el DataFrame modificado en el archivo Excel
             with pd.ExcelWriter(excel_file, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
@@ -48,5 +87,9 @@ else:
 
             print(f"✅ Filas 2, 3 y 4 eliminadas correctamente y 'Date' añadido en A1 de '{excel_file}'.")
 
+            # Actualizar el manifiesto y marcar el fichero resultante como ya normalizado
+            marca = cache_resultados.clave('ohlcv_archivo', manifiesto.registrar_cambio(excel_file)['hash'], version)
+            cache_resultados.guardar('ohlcv_archivo', marca, True)
+
         except Exception as e:
             print(f"❌ Error al procesar '{excel_file}': {e}")
@@ -4,6 +4,9 @@ import numpy as np
 import os
 from datetime import datetime
 
+import cache_resultados
+import manifiesto
+
 # -----------------------------------
 # Script para calcular indicadores técnicos de Momentum, Tendencia, Volumen, Osciladores, Volatilidad y Ichimoku
 # Incluye hoja resumen con ecuaciones y datos utilizados.
@@ -105,10 +108,8 @@ def HMA(series, period):
     hma_series = WMA(2 * wma_half - wma_full, sqrt_length)
     return hma_series
 
-# -----------------------------------
-# PROCESAMIENTO DE CADA ARCHIVO
-# -----------------------------------
-for file_path in file_paths:
+def calcular_indicadores(file_path):
+    """ Lee Sheet1 de un archivo y devuelve sus datos con todos los indicadores añadidos al final. """
     data = pd.read_excel(file_path, sheet_name='Sheet1')  # Leer Sheet1 directamente
 
     # Asegurarse de que los datos sean numéricos
@@ -250,8 +251,15 @@ for file_path in file_paths:
     })
 
     # Añadir los nuevos indicadores a Sheet1 (al final de las columnas)
-    sheet1_with_indicators = pd.concat([data, momentum, trend, volumen, osciladores, volatilidad, ichimoku, ciclos_y_patrones], axis=1)
+    return pd.concat([data, momentum, trend, volumen, osciladores, volatilidad, ichimoku, ciclos_y_patrones], axis=1)
+
+# -----------------------------------
+# PROCESAMIENTO DE CADA ARCHIVO
+# -----------------------------------
+# Versión del código para la caché: cambiar este script invalida las tablas guardadas
+version = cache_resultados.version_codigo(__file__)
 
+for file_path in file_paths:
     # Crear el nuevo directorio si no existe
     nuevo_directorio = os.path.join(os.getcwd(), hoy)
     if not os.path.exists(nuevo_directorio):
@@ -259,6 +267,17 @@ for file_path in file_paths:
 
     # Guardar el archivo actualizado
     output_file = os.path.join(nuevo_directorio, os.path.basename(file_path).replace('.xlsx', f'_indicadores_{hoy}.xlsx'))
+
+    # Consultar la caché antes de recalcular: la clave depende del contenido del archivo y del código
+    clave = cache_resultados.clave('indicadores', manifiesto.hash_archivo(file_path), version)
+    sheet1_with_indicators = cache_resultados.obtener('indicadores', clave)
+    if sheet1_with_indicators is not None and os.path.exists(output_file):
+        print(f"Sin cambios en '{file_path}', se mantiene '{output_file}'.")
+        continue
+    if sheet1_with_indicators is None:
+        sheet1_with_indicators = calcular_indicadores(file_path)
+        cache_resultados.guardar('indicadores', clave, sheet1_with_indicators)
+
     with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
         sheet1_with_indicators.to_excel(writer, sheet_name='Sheet1', index=False)
 
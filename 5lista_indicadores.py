@@ -1,29 +1,28 @@
 import os
 from datetime import datetime
 
+import manifiesto
+
 def listar_archivos(directorio):
     """
-    Lista los archivos en el directorio especificado, filtrando para incluir
-    solo aquellos que contienen 'indicadores' en su nombre.
+    Actualiza el manifiesto del día con los archivos del directorio especificado y
+    lista los que contienen 'indicadores' en su nombre, de mayor a menor tamaño.
 
     Args:
         directorio (str): El directorio a listar.
 
     Returns:
         list: Una lista de rutas completas de archivos que contienen 'indicadores' en su nombre.
+
+    Raises:
+        FileNotFoundError: Si el directorio no existe.
     """
-    # Verificar que el directorio existe
-    if not os.path.exists(directorio):
-        raise FileNotFoundError(f"El directorio {directorio} no existe.")
-    
-    # Listar los archivos en el directorio
-    archivos = os.listdir(directorio)
-    
-    # Filtrar los archivos que contienen "indicadores" en su nombre
-    archivos_filtrados = [archivo for archivo in archivos if "indicadores" in archivo]
+    # Actualizar el manifiesto (solo se leen los archivos nuevos o modificados)
+    datos, descritos = manifiesto.actualizar(directorio)
+    print(f"Manifiesto actualizado: {descritos} archivos nuevos o modificados")
     
-    # Generar las rutas completas de los archivos filtrados
-    rutas_completas = [os.path.join(directorio, archivo) for archivo in archivos_filtrados]
+    # Rutas completas de los archivos de indicadores, de mayor a menor tamaño
+    rutas_completas = manifiesto.rutas(datos, 'indicadores')
     
     return rutas_completas
 
@@ -0,0 +1,448 @@
+import argparse
+import json
+import os
+import re
+
+import pandas as pd
+
+# -----------------------------------
+# Histórico versionado de las descargas, en lugar de guardar cada día en AAAAMMDD/ una
+# copia completa desde 2022 de todos los símbolos.
+#
+# Cada símbolo tiene una carpeta en DIRECTORIO_HISTORICO con segmentos de solo adición:
+# cada versión (la fecha de la ejecución, AAAAMMDD) guarda únicamente las barras nuevas,
+# las revisadas y marcas de las barras que han desaparecido. Leer una versión reconstruye
+# exactamente la tabla que vio la ejecución de ese día (lectura "as-of").
+#
+#   historico/ACX.MC/indice.json            versiones, columnas y segmento de cada una
+#   historico/ACX.MC/20250301.csv.gz        cambios de una versión
+#   historico/ACX.MC/compactado_...csv.gz   varias versiones compactadas en un segmento
+#
+# Uso:
+#   py almacen.py migrar [--eliminar]          importa las carpetas AAAAMMDD existentes
+#   py almacen.py leer ACX.MC --version 20250301
+#   py almacen.py exportar 20250301             recrea la carpeta de ese día
+#   py almacen.py compactar [--desde 20250101]
+#   py almacen.py estado
+# -----------------------------------
+
+DIRECTORIO_HISTORICO = os.environ.get('KKDD_HISTORICO', os.path.join(os.getcwd(), 'historico'))
+ARCHIVO_INDICE = 'indice.json'
+
+# Columnas internas de los segmentos
+VERSION = '_version'
+BORRADO = '_borrado'
+
+_FORMATO_VERSION = re.compile(r'^\d{8}$')
+
+
+def _comprobar_version(version):
+    version = str(version)
+    if not _FORMATO_VERSION.match(version):
+        raise ValueError(f"Versión no válida (se espera AAAAMMDD): {version}")
+    return version
+
+
+def normalizar(df):
+    """
+    Convierte una descarga en la tabla que se guarda: columna Date seguida de los datos,
+    una fila por fecha y en orden. Acepta la salida de yfinance (índice de fechas y
+    columnas de dos niveles) o una hoja ya normalizada con columna Date.
+    """
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [col[0] for col in df.columns]
+    if 'Date' not in df.columns:
+        df = df.rename_axis('Date').reset_index()
+    df.columns = [str(col) for col in df.columns]
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df = df.dropna(subset=['Date']).drop_duplicates('Date', keep='last')
+    return df.sort_values('Date').reset_index(drop=True)
+
+
+def leer_descarga(ruta):
+    """
+    Lee la hoja Sheet1 de un fichero descargado por 1ibex.py, tanto en bruto (con las
+    filas de cabecera Price/Ticker/Date de yfinance) como ya limpiado por 3afilas2.py.
+    """
+    crudo = pd.read_excel(ruta, sheet_name='Sheet1', header=None)
+    primera = crudo.iloc[:, 0].astype(str)
+    fila_datos = 1
+    if primera.iloc[0] != 'Date':
+        # Las filas de datos empiezan después de la fila cuyo primer valor es 'Date'
+        cabecera_fechas = primera[primera == 'Date'].index
+        fila_datos = cabecera_fechas[0] + 1 if len(cabecera_fechas) else 1
+    df = crudo.iloc[fila_datos:].copy()
+    df.columns = ['Date'] + [str(col) for col in crudo.iloc[0, 1:]]
+    for col in df.columns[1:]:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return normalizar(df)
+
+
+def _carpeta(simbolo, directorio=None):
+    return os.path.join(directorio or DIRECTORIO_HISTORICO, simbolo)
+
+
+def leer_indice(simbolo, directorio=None):
+    """Índice de un símbolo: {'versiones': [...], 'minima': versión más antigua legible}."""
+    ruta = os.path.join(_carpeta(simbolo, directorio), ARCHIVO_INDICE)
+    if not os.path.exists(ruta):
+        return {'versiones': [], 'minima': None}
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def _guardar_indice(simbolo, indice, directorio=None):
+    ruta = os.path.join(_carpeta(simbolo, directorio), ARCHIVO_INDICE)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(indice, archivo, indent=1)
+    os.replace(temporal, ruta)
+
+
+def _escribir_segmento(simbolo, nombre, filas, directorio=None):
+    ruta = os.path.join(_carpeta(simbolo, directorio), nombre)
+    temporal = f"{ruta}.tmp"
+    filas.to_csv(temporal, index=False, compression='gzip')
+    os.replace(temporal, ruta)
+
+
+def _leer_segmento(simbolo, nombre, directorio=None):
+    # round_trip: los decimales se leen exactamente como se escribieron
+    return pd.read_csv(os.path.join(_carpeta(simbolo, directorio), nombre), compression='gzip',
+                       dtype={VERSION: str}, parse_dates=['Date'], float_precision='round_trip')
+
+
+def simbolos(directorio=None):
+    """Símbolos con histórico."""
+    directorio = directorio or DIRECTORIO_HISTORICO
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(entrada.name for entrada in os.scandir(directorio)
+                  if entrada.is_dir() and os.path.exists(os.path.join(entrada.path, ARCHIVO_INDICE)))
+
+
+def versiones(simbolo, directorio=None):
+    return [entrada['version'] for entrada in leer_indice(simbolo, directorio)['versiones']]
+
+
+def _estado(simbolo, indice, version, directorio=None):
+    """
+    Reconstruye todas las filas vigentes en una versión (con todas las columnas guardadas).
+
+    Returns:
+        tuple: (entrada del índice de la versión aplicada, DataFrame indexado por Date)
+            o (None, None) si no hay ninguna versión anterior o igual.
+    """
+    if indice.get('minima') and version < indice['minima']:
+        raise ValueError(f"{simbolo}: las versiones anteriores a {indice['minima']} se han compactado")
+    disponibles = [e for e in indice['versiones'] if e['version'] <= version]
+    if not disponibles:
+        return None, None
+    entrada = disponibles[-1]
+    segmentos = [nombre for nombre in dict.fromkeys(e['segmento'] for e in disponibles) if nombre]
+    if segmentos:
+        filas = pd.concat([_leer_segmento(simbolo, nombre, directorio) for nombre in segmentos], ignore_index=True)
+    else:
+        filas = pd.DataFrame(columns=['Date', VERSION, BORRADO])
+    filas = filas[filas[VERSION] <= entrada['version']]
+    # La última versión de cada fecha es la vigente; las borradas desaparecen
+    filas = filas.sort_values(['Date', VERSION], kind='stable').drop_duplicates('Date', keep='last')
+    filas = filas[filas[BORRADO] == 0].drop(columns=[VERSION, BORRADO])
+    return entrada, filas.set_index('Date')
+
+
+def leer(simbolo, version=None, directorio=None):
+    """
+    Tabla de un símbolo tal como la vio la ejecución de una versión (por defecto, la última).
+    Si no hay una ejecución ese día se devuelve la de la versión anterior más reciente.
+
+    Raises:
+        KeyError: Si el símbolo no tiene ninguna versión anterior o igual.
+        ValueError: Si la versión se ha eliminado al compactar.
+    """
+    version = '99999999' if version is None else _comprobar_version(version)
+    entrada, filas = _estado(simbolo, leer_indice(simbolo, directorio), version, directorio)
+    if entrada is None:
+        raise KeyError(f"{simbolo} no tiene histórico en la versión {version}")
+    return filas.reindex(columns=entrada['columnas']).reset_index()
+
+
+def registrar(simbolo, df, version, directorio=None):
+    """
+    Añade una versión con la descarga completa de un símbolo, guardando solo las
+    barras nuevas, las revisadas y las desaparecidas respecto a la versión anterior.
+    Registrar de nuevo la última versión (otra ejecución el mismo día) la sustituye.
+
+    Returns:
+        dict: Número de barras 'nuevas', 'revisadas' y 'borradas'.
+
+    Raises:
+        ValueError: Si la versión es anterior a la última registrada.
+    """
+    version = _comprobar_version(version)
+    tabla = normalizar(df).set_index('Date')
+    os.makedirs(_carpeta(simbolo, directorio), exist_ok=True)
+    indice = leer_indice(simbolo, directorio)
+
+    if indice['versiones'] and version < indice['versiones'][-1]['version']:
+        raise ValueError(f"{simbolo}: la versión {version} es anterior a la última ({indice['versiones'][-1]['version']})")
+    if indice['versiones'] and indice['versiones'][-1]['version'] == version:
+        sustituida = indice['versiones'].pop()
+        if sustituida['segmento'] and sustituida['segmento'] != f"{version}.csv.gz":
+            raise ValueError(f"{simbolo}: la versión {version} está compactada y no se puede sustituir")
+
+    # Estado anterior (la versión inmediatamente anterior) sobre las columnas de la descarga
+    _, anterior = _estado(simbolo, indice, version, directorio)
+    if anterior is None:
+        anterior = pd.DataFrame(columns=tabla.columns, index=pd.DatetimeIndex([], name='Date'))
+    anterior = anterior.reindex(columns=tabla.columns)
+
+    comunes = tabla.index.intersection(anterior.index)
+    nuevo, viejo = tabla.loc[comunes], anterior.loc[comunes]
+    distintas = ((nuevo != viejo) & ~(nuevo.isna() & viejo.isna())).any(axis=1)
+    revisadas = comunes[distintas.to_numpy()]
+    nuevas = tabla.index.difference(anterior.index)
+    borradas = anterior.index.difference(tabla.index)
+
+    cambios = tabla.loc[nuevas.union(revisadas)].assign(**{BORRADO: 0})
+    marcas = pd.DataFrame({BORRADO: 1}, index=borradas)
+    filas = pd.concat([cambios, marcas]).sort_index().rename_axis('Date').reset_index()
+    filas.insert(1, VERSION, version)
+
+    segmento = f"{version}.csv.gz"
+    if len(filas):
+        _escribir_segmento(simbolo, segmento, filas, directorio)
+    else:
+        # Sin cambios: no se escribe segmento (y se descarta el de una ejecución anterior del mismo día)
+        if os.path.exists(os.path.join(_carpeta(simbolo, directorio), segmento)):
+            os.remove(os.path.join(_carpeta(simbolo, directorio), segmento))
+        segmento = None
+    indice['versiones'].append({
+        'version': version, 'segmento': segmento, 'columnas': list(tabla.columns),
+        'nuevas': len(nuevas), 'revisadas': len(revisadas), 'borradas': len(borradas)
+    })
+    _guardar_indice(simbolo, indice, directorio)
+    return {'nuevas': len(nuevas), 'revisadas': len(revisadas), 'borradas': len(borradas)}
+
+
+def compactar(simbolo, desde=None, directorio=None):
+    """
+    Une en un solo segmento todos los segmentos salvo el de la última versión (que así
+    se puede seguir sustituyendo). Las lecturas as-of de todas las versiones se conservan,
+    salvo con `desde`: las versiones anteriores se resumen en el estado de la última de
+    ellas y ya no se pueden leer.
+
+    Returns:
+        int: Número de segmentos eliminados.
+    """
+    indice = leer_indice(simbolo, directorio)
+    if len(indice['versiones']) < 2:
+        return 0
+    compactables = indice['versiones'][:-1]
+    if desde is None and len({e['segmento'] for e in compactables if e['segmento']}) < 2:
+        return 0
+    filas = pd.concat([_leer_segmento(simbolo, nombre, directorio)
+                       for nombre in dict.fromkeys(e['segmento'] for e in compactables) if nombre],
+                      ignore_index=True) if any(e['segmento'] for e in compactables) else None
+
+    if desde is not None:
+        desde = _comprobar_version(desde)
+        antiguas = [e for e in compactables if e['version'] < desde]
+        if antiguas and filas is not None:
+            base = antiguas[-1]['version']
+            _, estado = _estado(simbolo, indice, base, directorio)
+            resumen = estado.reset_index().assign(**{VERSION: base, BORRADO: 0})
+            filas = pd.concat([resumen, filas[filas[VERSION] > base]], ignore_index=True)
+            compactables = [e for e in compactables if e['version'] >= base]
+            indice['versiones'] = [e for e in indice['versiones'] if e['version'] >= base]
+            indice['minima'] = base
+
+    anteriores = {e['segmento'] for e in leer_indice(simbolo, directorio)['versiones'][:-1] if e['segmento']}
+    nombre = f"compactado_{compactables[-1]['version']}.csv.gz"
+    if filas is not None:
+        columnas = ['Date', VERSION, BORRADO] + [c for c in filas.columns if c not in ('Date', VERSION, BORRADO)]
+        _escribir_segmento(simbolo, nombre, filas[columnas].sort_values([VERSION, 'Date'], kind='stable'), directorio)
+    for entrada in compactables:
+        entrada['segmento'] = nombre if filas is not None else None
+    _guardar_indice(simbolo, indice, directorio)
+
+    eliminados = 0
+    for anterior in anteriores - {nombre}:
+        os.remove(os.path.join(_carpeta(simbolo, directorio), anterior))
+        eliminados += 1
+    return eliminados
+
+
+def _coincide(simbolo, version, tabla, directorio=None):
+    """
+    Comprueba que la lectura as-of de una versión reproduce un fichero de esa carpeta.
+    Se admiten barras guardadas anteriores a la primera del fichero: 3afilas2.py elimina
+    la primera barra junto con las filas de cabecera.
+    """
+    try:
+        guardada = leer(simbolo, version, directorio)
+    except (KeyError, ValueError):
+        return False
+    guardada = guardada[guardada['Date'] >= tabla['Date'].min()].reset_index(drop=True)
+    if list(guardada.columns) != list(tabla.columns):
+        return False
+    try:
+        pd.testing.assert_frame_equal(guardada, tabla.reset_index(drop=True), check_dtype=False,
+                                      check_exact=False, rtol=1e-12)
+    except AssertionError:
+        return False
+    return True
+
+
+def carpetas_diarias(directorio_base='.'):
+    """Carpetas AAAAMMDD de las descargas diarias, de la más antigua a la más reciente."""
+    return sorted(entrada.name for entrada in os.scandir(directorio_base)
+                  if entrada.is_dir() and _FORMATO_VERSION.match(entrada.name))
+
+
+def migrar(directorio_base='.', eliminar=False, conservar=1, directorio=None, incluir_indicadores=False):
+    """
+    Importa las carpetas AAAAMMDD existentes como versiones, de la más antigua a la más
+    reciente, y comprueba que cada fichero se puede reconstruir desde el histórico.
+
+    Args:
+        eliminar (bool): Borrar los ficheros descargados que se reconstruyen exactamente.
+            La carpeta solo se borra si queda vacía.
+        conservar (int): Carpetas más recientes que no se borran nunca.
+        incluir_indicadores (bool): Borrar también los ficheros de indicadores de las
+            carpetas cuyas descargas se reconstruyen todas. Sus hojas kkddb2_N (resultados
+            de backtests anteriores) no se pueden recrear.
+    """
+    carpetas = carpetas_diarias(directorio_base)
+    for posicion, fecha in enumerate(carpetas):
+        ruta_carpeta = os.path.join(directorio_base, fecha)
+        verificada = True
+        importados = 0
+        verificados = []
+        indicadores = []
+        for entrada in sorted(os.scandir(ruta_carpeta), key=lambda e: e.name):
+            sufijo = f"_{fecha}.xlsx"
+            if not entrada.name.endswith(sufijo):
+                continue
+            if "indicadores" in entrada.name:
+                indicadores.append(entrada.path)
+                continue
+            simbolo = entrada.name[:-len(sufijo)]
+            try:
+                tabla = leer_descarga(entrada.path)
+                if fecha not in versiones(simbolo, directorio):
+                    registrar(simbolo, tabla, fecha, directorio)
+                    importados += 1
+                if _coincide(simbolo, fecha, tabla, directorio):
+                    verificados.append(entrada.path)
+                else:
+                    print(f"⚠️ {entrada.path} no coincide con el histórico de {fecha}")
+                    verificada = False
+            except Exception as e:
+                print(f"❌ Error al importar {entrada.path}: {e}")
+                verificada = False
+        print(f"{fecha}: {importados} ficheros importados")
+
+        if eliminar and posicion < len(carpetas) - conservar:
+            borrar = verificados + (indicadores if incluir_indicadores and verificada else [])
+            for ruta in borrar:
+                os.remove(ruta)
+            if borrar:
+                print(f"🗑️ {len(borrar)} ficheros eliminados de {ruta_carpeta} "
+                      f"(se pueden recrear con: py almacen.py exportar {fecha})")
+            if not os.listdir(ruta_carpeta):
+                os.rmdir(ruta_carpeta)
+
+
+def exportar(version, destino=None, directorio=None):
+    """
+    Recrea los ficheros de un día (ya normalizados, como tras 3afilas2.py) a partir
+    del histórico.
+
+    Returns:
+        list: Rutas de los ficheros escritos.
+    """
+    version = _comprobar_version(version)
+    destino = destino or version
+    os.makedirs(destino, exist_ok=True)
+    rutas = []
+    for simbolo in simbolos(directorio):
+        try:
+            tabla = leer(simbolo, version, directorio)
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ {e}")
+            continue
+        ruta = os.path.join(destino, f"{simbolo}_{version}.xlsx")
+        tabla.to_excel(ruta, sheet_name='Sheet1', index=False)
+        rutas.append(ruta)
+    return rutas
+
+
+def _tamano(ruta):
+    total = 0
+    for raiz, _, archivos in os.walk(ruta):
+        total += sum(os.path.getsize(os.path.join(raiz, nombre)) for nombre in archivos)
+    return total
+
+
+def imprimir_estado(directorio_base='.', directorio=None):
+    print(f"Histórico: {directorio or DIRECTORIO_HISTORICO}")
+    print(f"{'Símbolo':<12} {'Versiones':>9} {'Primera':>9} {'Última':>9} {'Segmentos':>9} {'KB':>9}")
+    for simbolo in simbolos(directorio):
+        indice = leer_indice(simbolo, directorio)
+        lista = indice['versiones']
+        segmentos = len({e['segmento'] for e in lista if e['segmento']})
+        print(f"{simbolo:<12} {len(lista):>9} {lista[0]['version']:>9} {lista[-1]['version']:>9} "
+              f"{segmentos:>9} {_tamano(_carpeta(simbolo, directorio)) / 1024:>9.1f}")
+    carpetas = carpetas_diarias(directorio_base)
+    print(f"Tamaño del histórico: {_tamano(directorio or DIRECTORIO_HISTORICO) / 1024 / 1024:.1f} MB; "
+          f"{len(carpetas)} carpetas diarias: "
+          f"{sum(_tamano(os.path.join(directorio_base, c)) for c in carpetas) / 1024 / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico versionado de las descargas diarias.")
+    subparsers = parser.add_subparsers(dest='accion', required=True)
+
+    p = subparsers.add_parser('migrar', help="Importa las carpetas AAAAMMDD existentes")
+    p.add_argument('--eliminar', action='store_true', help="Borrar los ficheros descargados verificados")
+    p.add_argument('--incluir-indicadores', action='store_true',
+                   help="Con --eliminar, borrar también los ficheros de indicadores (sus hojas kkddb2_N se pierden)")
+    p.add_argument('--conservar', type=int, default=1, help="Carpetas más recientes que no se borran")
+
+    p = subparsers.add_parser('leer', help="Muestra la tabla de un símbolo en una versión")
+    p.add_argument('simbolo')
+    p.add_argument('--version', help="AAAAMMDD (por defecto, la última)")
+    p.add_argument('--filas', type=int, default=10, help="Últimas filas a mostrar")
+
+    p = subparsers.add_parser('exportar', help="Recrea los ficheros de un día desde el histórico")
+    p.add_argument('version', help="AAAAMMDD")
+    p.add_argument('--destino', help="Carpeta de salida (por defecto, AAAAMMDD)")
+
+    p = subparsers.add_parser('compactar', help="Une los segmentos de cada símbolo")
+    p.add_argument('--desde', help="Resumir las versiones anteriores a esta fecha (AAAAMMDD)")
+
+    subparsers.add_parser('estado', help="Versiones y tamaño del histórico")
+    args = parser.parse_args()
+
+    if args.accion == 'migrar':
+        migrar(eliminar=args.eliminar, conservar=args.conservar, incluir_indicadores=args.incluir_indicadores)
+    elif args.accion == 'leer':
+        try:
+            print(leer(args.simbolo, args.version).tail(args.filas).to_string(index=False))
+        except (KeyError, ValueError) as e:
+            print(e)
+    elif args.accion == 'exportar':
+        rutas = exportar(args.version, args.destino)
+        print(f"{len(rutas)} ficheros escritos en {args.destino or args.version}")
+    elif args.accion == 'compactar':
+        for simbolo in simbolos():
+            eliminados = compactar(simbolo, args.desde)
+            print(f"{simbolo}: {eliminados} segmentos compactados")
+    else:
+        imprimir_estado()
+
+
+if __name__ == "__main__":
+    main()
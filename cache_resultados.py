@@ -0,0 +1,220 @@
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+# -----------------------------------
+# Caché en disco de los resultados por símbolo de cada etapa (OHLCV normalizado,
+# tablas de indicadores y backtests). La clave es un hash de los datos de entrada,
+# de la versión del código de la etapa y de sus parámetros, así que una nueva
+# ejecución con las mismas entradas reutiliza el resultado en lugar de recalcularlo.
+#
+# Las entradas se desalojan por LRU (fecha de último acceso) cuando el tamaño total
+# supera el máximo. Uso:
+#   py cache_resultados.py estadisticas
+#   py cache_resultados.py purgar [--etapa indicadores]
+# -----------------------------------
+
+DIRECTORIO_CACHE = os.environ.get('KKDD_CACHE', os.path.join(os.getcwd(), '.cache_kkdd'))
+TAMANO_MAXIMO = int(float(os.environ.get('KKDD_CACHE_MB', 2048)) * 1024 * 1024)
+ARCHIVO_ESTADISTICAS = 'estadisticas.json'
+
+# Aciertos y fallos de esta ejecución, por etapa; se acumulan en disco al terminar
+_estadisticas = {}
+
+
+def _hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def hash_archivo(ruta):
+    """Hash del contenido de un fichero."""
+    h = _hash()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def hash_dataframe(df):
+    """Hash del contenido de un DataFrame (valores, índice y nombres de columna)."""
+    import pandas as pd
+
+    h = _hash()
+    h.update(json.dumps([str(col) for col in df.columns]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def version_codigo(*rutas):
+    """Versión del código de una etapa: hash de sus ficheros fuente."""
+    return '-'.join(hash_archivo(ruta)[:12] for ruta in rutas)
+
+
+def clave(etapa, entrada, version, parametros=None):
+    """Clave de caché a partir del hash de la entrada, la versión del código y los parámetros."""
+    h = _hash()
+    h.update(json.dumps([etapa, entrada, version, parametros or {}], sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _ruta(etapa, clave_entrada):
+    return os.path.join(DIRECTORIO_CACHE, etapa, f"{clave_entrada}.pkl")
+
+
+def _contar(etapa, resultado):
+    if not _estadisticas:
+        atexit.register(guardar_estadisticas)
+    contadores = _estadisticas.setdefault(etapa, {'aciertos': 0, 'fallos': 0})
+    contadores[resultado] += 1
+
+
+def obtener(etapa, clave_entrada):
+    """
+    Devuelve el valor guardado para la clave, o None si no está en la caché.
+    Cada acierto renueva la fecha de acceso de la entrada para el LRU.
+    """
+    ruta = _ruta(etapa, clave_entrada)
+    try:
+        with open(ruta, 'rb') as archivo:
+            valor = pickle.load(archivo)
+    except FileNotFoundError:
+        _contar(etapa, 'fallos')
+        return None
+    except Exception as e:
+        print(f"⚠️ Entrada de caché dañada, se descarta: {ruta} ({e})")
+        os.remove(ruta)
+        _contar(etapa, 'fallos')
+        return None
+    os.utime(ruta)
+    _contar(etapa, 'aciertos')
+    return valor
+
+
+def guardar(etapa, clave_entrada, valor):
+    """Guarda un valor en la caché y desaloja entradas antiguas si se supera el tamaño máximo."""
+    ruta = _ruta(etapa, clave_entrada)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as archivo:
+        pickle.dump(valor, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta)
+    desalojar()
+
+
+def _entradas():
+    """Lista (fecha de acceso, tamaño, ruta) de todas las entradas de la caché."""
+    entradas = []
+    if not os.path.isdir(DIRECTORIO_CACHE):
+        return entradas
+    for etapa in os.scandir(DIRECTORIO_CACHE):
+        if not etapa.is_dir():
+            continue
+        for entrada in os.scandir(etapa.path):
+            if entrada.name.endswith('.pkl'):
+                estado = entrada.stat()
+                entradas.append((estado.st_mtime, estado.st_size, entrada.path))
+    return entradas
+
+
+def desalojar(tamano_maximo=None):
+    """
+    Elimina las entradas menos usadas recientemente hasta que el tamaño total
+    sea menor o igual que el máximo.
+
+    Returns:
+        int: Número de entradas eliminadas.
+    """
+    tamano_maximo = TAMANO_MAXIMO if tamano_maximo is None else tamano_maximo
+    entradas = _entradas()
+    total = sum(tamano for _, tamano, _ in entradas)
+    eliminadas = 0
+    for _, tamano, ruta in sorted(entradas):
+        if total <= tamano_maximo:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+        eliminadas += 1
+    return eliminadas
+
+
+def guardar_estadisticas():
+    """Acumula en disco los aciertos y fallos de esta ejecución."""
+    if not _estadisticas or not os.path.isdir(DIRECTORIO_CACHE):
+        return
+    ruta = os.path.join(DIRECTORIO_CACHE, ARCHIVO_ESTADISTICAS)
+    acumuladas = leer_estadisticas()
+    for etapa, contadores in _estadisticas.items():
+        destino = acumuladas.setdefault(etapa, {'aciertos': 0, 'fallos': 0})
+        for nombre, valor in contadores.items():
+            destino[nombre] += valor
+    with open(ruta, 'w') as archivo:
+        json.dump(acumuladas, archivo, indent=2)
+    _estadisticas.clear()
+
+
+def leer_estadisticas():
+    ruta = os.path.join(DIRECTORIO_CACHE, ARCHIVO_ESTADISTICAS)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, 'r') as archivo:
+        return json.load(archivo)
+
+
+def purgar(etapa=None):
+    """Elimina toda la caché o solo las entradas de una etapa."""
+    ruta = os.path.join(DIRECTORIO_CACHE, etapa) if etapa else DIRECTORIO_CACHE
+    if os.path.isdir(ruta):
+        shutil.rmtree(ruta)
+    if etapa:
+        estadisticas = leer_estadisticas()
+        if estadisticas.pop(etapa, None) is not None:
+            with open(os.path.join(DIRECTORIO_CACHE, ARCHIVO_ESTADISTICAS), 'w') as archivo:
+                json.dump(estadisticas, archivo, indent=2)
+
+
+def imprimir_estadisticas():
+    """Muestra entradas, tamaño, aciertos y fallos por etapa."""
+    guardar_estadisticas()
+    estadisticas = leer_estadisticas()
+    por_etapa = {}
+    for _, tamano, ruta in _entradas():
+        etapa = os.path.basename(os.path.dirname(ruta))
+        entradas, total = por_etapa.get(etapa, (0, 0))
+        por_etapa[etapa] = (entradas + 1, total + tamano)
+
+    print(f"Caché: {DIRECTORIO_CACHE} (máximo {TAMANO_MAXIMO / 1024 / 1024:.0f} MB)")
+    print(f"{'Etapa':<18} {'Entradas':>9} {'MB':>9} {'Aciertos':>9} {'Fallos':>9} {'% acierto':>10}")
+    for etapa in sorted(set(por_etapa) | set(estadisticas)):
+        entradas, tamano = por_etapa.get(etapa, (0, 0))
+        aciertos = estadisticas.get(etapa, {}).get('aciertos', 0)
+        fallos = estadisticas.get(etapa, {}).get('fallos', 0)
+        porcentaje = f"{aciertos / (aciertos + fallos) * 100:.1f}" if aciertos + fallos else "-"
+        print(f"{etapa:<18} {entradas:>9} {tamano / 1024 / 1024:>9.1f} {aciertos:>9} {fallos:>9} {porcentaje:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gestión de la caché de resultados por símbolo.")
+    parser.add_argument('accion', choices=['estadisticas', 'purgar', 'desalojar'])
+    parser.add_argument('--etapa', help="Limitar la purga a una etapa")
+    parser.add_argument('--max-mb', type=float, help="Tamaño máximo para desalojar (por defecto KKDD_CACHE_MB)")
+    args = parser.parse_args()
+
+    if args.accion == 'estadisticas':
+        imprimir_estadisticas()
+    elif args.accion == 'purgar':
+        purgar(args.etapa)
+        print(f"Caché purgada{f' (etapa {args.etapa})' if args.etapa else ''}.")
+    else:
+        maximo = None if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+        print(f"Entradas desalojadas: {desalojar(maximo)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import os
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------
+# Motor de correlaciones y covarianzas móviles entre los valores del IBEX y las series
+# macro que 1ibex.py añade a cada fichero (divisas y rentabilidades del Tesoro).
+#
+# En lugar de recalcular rolling().corr por cada par, se mantienen sumas por pares
+# sobre la ventana y cada barra nueva las actualiza sumando la entrante y restando la
+# saliente: O(N²) por barra, independiente de la longitud de la ventana.
+#
+# Salidas:
+#   correlaciones_AAAAMMDD.npz      matrices de correlación, covarianza y betas por fecha
+#   correlaciones_AAAAMMDD.csv      última matriz de correlación (hoja del informe)
+#   betas_macro_AAAAMMDD.csv        últimas betas de cada valor frente a cada serie macro
+#   limites_posicion_AAAAMMDD.csv   límite de exposición por valor y fecha para kkddtemu2.py
+# -----------------------------------
+
+# Las mismas series adicionales que descarga 1ibex.py
+SERIES_MACRO = ['EURUSD=X', 'CNY=X', '^IRX', '^FVX', '^TNX', '^TYX']
+
+# Cada cuántas barras se recalculan las sumas desde cero para no acumular error numérico
+RESINCRONIZAR = 1000
+
+# Barras seguidas sin cotización (festivos de EE. UU.) que se rellenan con el último
+# nivel de las series macro antes de calcular sus variaciones
+RELLENO_MACRO = 5
+
+
+def nuevo_estado(num_series):
+    """Sumas por pares de la ventana: observaciones, Σx, Σx² y Σxy sobre fechas con ambos datos."""
+    return {
+        'n': np.zeros((num_series, num_series)),
+        'sx': np.zeros((num_series, num_series)),
+        'sxx': np.zeros((num_series, num_series)),
+        'sxy': np.zeros((num_series, num_series))
+    }
+
+
+def _contribucion(x):
+    """Contribución de una barra a las sumas por pares (los NaN no cuentan)."""
+    valido = ~np.isnan(x)
+    x = np.where(valido, x, 0.0)
+    m = valido.astype(float)
+    ambos = np.outer(m, m)
+    return ambos, np.outer(x, m), np.outer(x * x, m), np.outer(x, x)
+
+
+def actualizar(estado, entrante, saliente=None):
+    """
+    Actualiza las sumas de la ventana con la barra entrante y, si la ventana ya está
+    llena, descuenta la barra que sale.
+    """
+    for signo, x in ((1.0, entrante), (-1.0, saliente)):
+        if x is None:
+            continue
+        ambos, sx, sxx, sxy = _contribucion(x)
+        estado['n'] += signo * ambos
+        estado['sx'] += signo * sx
+        estado['sxx'] += signo * sxx
+        estado['sxy'] += signo * sxy
+
+
+def momentos(estado, minimo):
+    """
+    Covarianza y correlación por pares a partir de las sumas, con la misma definición
+    que pandas (ddof=1, observaciones comunes a cada par).
+
+    Returns:
+        tuple: (covarianza, correlación, varianza por pares) como matrices N x N.
+            varianza[i, j] es la varianza de i sobre las fechas comunes con j.
+    """
+    n, sx, sxx, sxy = estado['n'], estado['sx'], estado['sxx'], estado['sxy']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covarianza = (sxy - sx * sx.T / n) / (n - 1)
+        varianza = np.maximum((sxx - sx * sx / n) / (n - 1), 0.0)
+        correlacion = covarianza / np.sqrt(varianza * varianza.T)
+    insuficiente = n < minimo
+    covarianza[insuficiente] = np.nan
+    correlacion[insuficiente] = np.nan
+    varianza[insuficiente] = np.nan
+    return covarianza, np.clip(correlacion, -1.0, 1.0), varianza
+
+
+def correlaciones_moviles(retornos, ventana=60, minimo=None):
+    """
+    Calcula las matrices móviles de covarianza, correlación y betas de un panel.
+
+    Args:
+        retornos (numpy.ndarray): Rendimientos (fechas, series), con NaN donde falten datos.
+        ventana (int): Longitud de la ventana en barras.
+        minimo (int): Observaciones comunes mínimas por par (por defecto, la ventana).
+
+    Returns:
+        dict: Arrays (fechas, series, series) 'cov', 'corr' y 'beta', donde
+            beta[t, i, j] = cov(i, j) / var(j) es la beta de la serie i frente a la j.
+    """
+    minimo = ventana if minimo is None else minimo
+    num_fechas, num_series = retornos.shape
+    resultado = {clave: np.full((num_fechas, num_series, num_series), np.nan) for clave in ['cov', 'corr', 'beta']}
+    estado = nuevo_estado(num_series)
+    for t in range(num_fechas):
+        if t % RESINCRONIZAR == 0 and t:
+            estado = nuevo_estado(num_series)
+            for fila in retornos[max(0, t - ventana):t]:
+                actualizar(estado, fila)
+        actualizar(estado, retornos[t], retornos[t - ventana] if t >= ventana else None)
+        covarianza, correlacion, varianza = momentos(estado, minimo)
+        resultado['cov'][t] = covarianza
+        resultado['corr'][t] = correlacion
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resultado['beta'][t] = covarianza / varianza.T
+    return resultado
+
+
+def limites_posicion(correlacion, num_valores, limite_minimo=0.2):
+    """
+    Límite de exposición de cada valor según su correlación media con el resto del panel:
+    1 - correlación media positiva, acotado a [limite_minimo, 1]. Sin datos el límite es 1.
+
+    Args:
+        correlacion (numpy.ndarray): Matrices (fechas, series, series); los valores van primero.
+        num_valores (int): Número de valores (el resto de series son macro).
+    """
+    panel = correlacion[:, :num_valores, :num_valores].copy()
+    indices = np.arange(num_valores)
+    panel[:, indices, indices] = np.nan
+    # nanmean avisa de las filas sin ningún dato (al principio de la serie)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        media = np.nanmean(panel, axis=2)
+    return np.clip(1 - np.nan_to_num(np.maximum(media, 0.0)), limite_minimo, 1.0)
+
+
+def cargar_panel(file_paths):
+    """
+    Lee el Close de cada valor y las series macro (del primer fichero que las tenga)
+    y los alinea por fecha.
+
+    Returns:
+        tuple: (DataFrame de precios, lista de valores, lista de series macro)
+    """
+    cierres = {}
+    macro = None
+    for file_path in file_paths:
+        simbolo = os.path.basename(file_path).split('.')[0]
+        try:
+            data = pd.read_excel(file_path, sheet_name='Sheet1')
+        except Exception as e:
+            print(f"Error al leer {file_path}: {e}")
+            continue
+        data['Date'] = pd.to_datetime(data['Date'], errors='coerce')
+        data = data.dropna(subset=['Date']).set_index('Date')
+        cierres[simbolo] = pd.to_numeric(data['Close'], errors='coerce')
+        if macro is None and any(serie in data.columns for serie in SERIES_MACRO):
+            macro = data[[serie for serie in SERIES_MACRO if serie in data.columns]].apply(pd.to_numeric, errors='coerce')
+
+    valores = sorted(cierres)
+    panel = pd.DataFrame(cierres)[valores]
+    series_macro = []
+    if macro is not None:
+        series_macro = list(macro.columns)
+        panel = panel.join(macro, how='left')
+    return panel.sort_index(), valores, series_macro
+
+
+def rendimientos(panel, series_macro):
+    """
+    Rendimientos de los precios y de las divisas; variaciones absolutas de los tipos de
+    interés (^). Los niveles macro se rellenan con el último valor en los festivos de su
+    mercado: sin relleno, el festivo y la barra siguiente quedarían sin dato y casi ninguna
+    ventana tendría todas las observaciones.
+    """
+    panel = panel.copy()
+    if series_macro:
+        panel[series_macro] = panel[series_macro].ffill(limit=RELLENO_MACRO)
+    cambios = panel.pct_change(fill_method=None)
+    for serie in series_macro:
+        if serie.startswith('^'):
+            cambios[serie] = panel[serie].diff()
+    return cambios
+
+
+def main():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description="Correlaciones y betas móviles del panel y las series macro.")
+    parser.add_argument('--lista', default=f"lista_{hoy}.txt", help="Lista de ficheros descargados")
+    parser.add_argument('--ventana', type=int, default=60, help="Ventana en barras")
+    parser.add_argument('--minimo', type=int, default=None,
+                        help="Observaciones comunes mínimas por par dentro de la ventana (por defecto, la ventana)")
+    parser.add_argument('--limite-minimo', type=float, default=0.2, help="Límite de exposición mínimo")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.lista):
+        print(f"El fichero {args.lista} no existe.")
+        return
+    with open(args.lista, 'r') as file:
+        file_paths = [line.strip() for line in file if line.strip() and "indicadores" not in line]
+
+    panel, valores, series_macro = cargar_panel(file_paths)
+    if not valores:
+        print("No se encontraron datos.")
+        return
+    nombres = valores + series_macro
+    resultado = correlaciones_moviles(rendimientos(panel, series_macro).to_numpy(dtype=float), args.ventana,
+                                       args.minimo)
+
+    fechas = panel.index
+    np.savez_compressed(f"correlaciones_{hoy}.npz", fechas=fechas.strftime('%Y-%m-%d').to_numpy(),
+                        nombres=np.array(nombres), **resultado)
+
+    ultima = pd.DataFrame(resultado['corr'][-1], index=nombres, columns=nombres)
+    ultima.round(3).rename_axis('Variable').reset_index().to_csv(f"correlaciones_{hoy}.csv", index=False)
+    betas = pd.DataFrame(resultado['beta'][-1][:len(valores), len(valores):], index=valores, columns=series_macro)
+    betas.round(4).rename_axis('Variable').reset_index().to_csv(f"betas_macro_{hoy}.csv", index=False)
+
+    limites = pd.DataFrame(limites_posicion(resultado['corr'], len(valores), args.limite_minimo),
+                           index=fechas, columns=valores)
+    limites.round(3).reset_index().to_csv(f"limites_posicion_{hoy}.csv", index=False)
+
+    print(f"Correlaciones de {len(valores)} valores y {len(series_macro)} series macro "
+          f"({len(fechas)} fechas, ventana {args.ventana}) guardadas en correlaciones_{hoy}.npz")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import expresiones
+
+# -----------------------------------
+# Cribado transversal: índice con los valores de la última barra de cada símbolo
+# (todos los indicadores de 4indicadores8.py y las señales de kkddtemu2.py)
+# y consultas de filtro/orden sobre todo el universo con rangos y percentiles.
+#
+# Ejemplos:
+#   py cribado.py "RSI < 30 & Compra == 1" --orden "RSI" --columnas Close Valor
+#   py cribado.py "Stochastic_%K > Stochastic_%D" --orden "Rentabilidad desc" --limite 10
+# -----------------------------------
+
+INDICE_POR_DEFECTO = 'indice_cribado.pkl'
+VERSION_INDICE = 1
+
+
+def _indice_vacio():
+    return {'version': VERSION_INDICE, 'fuentes': {}, 'simbolos': [], 'columnas': {}}
+
+
+def cargar_indice(ruta=INDICE_POR_DEFECTO):
+    """Carga el índice desde disco, o devuelve uno vacío si no existe o es de otra versión."""
+    if not os.path.exists(ruta):
+        return _indice_vacio()
+    with open(ruta, 'rb') as archivo:
+        indice = pickle.load(archivo)
+    if indice.get('version') != VERSION_INDICE:
+        return _indice_vacio()
+    return indice
+
+
+def guardar_indice(indice, ruta=INDICE_POR_DEFECTO):
+    """Guarda el índice de forma atómica."""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'wb') as archivo:
+        pickle.dump(indice, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta)
+
+
+def _huella(ruta):
+    estado = os.stat(ruta)
+    return {'mtime_ns': estado.st_mtime_ns, 'size': estado.st_size}
+
+
+def hoja_kkddb2_reciente(hojas):
+    """Nombre de la hoja kkddb2 más reciente (kkddb2, kkddb2_1, ...) o None si no hay ninguna."""
+    hojas = [hoja for hoja in hojas if hoja == 'kkddb2' or hoja.startswith('kkddb2_')]
+    if not hojas:
+        return None
+    return max(hojas, key=lambda hoja: int(hoja.split('_')[1]) if '_' in hoja else 0)
+
+
+def ultima_barra(file_path):
+    """
+    Lee la última barra de un fichero de indicadores: la última fila de Sheet1 más las
+    columnas de señales de la hoja kkddb2 más reciente (kkddb2, kkddb2_1, ...).
+    Las columnas de kkddb2 que ya existen en Sheet1 se toman de Sheet1.
+    """
+    import pandas as pd
+
+    xl = pd.ExcelFile(file_path)
+    fila = xl.parse('Sheet1').iloc[-1].to_dict()
+
+    reciente = hoja_kkddb2_reciente(xl.sheet_names)
+    if reciente:
+        senales = xl.parse(reciente).iloc[-1].to_dict()
+        for columna, valor in senales.items():
+            fila.setdefault(columna, valor)
+    return fila
+
+
+def _valor_simple(valor):
+    """Convierte escalares de numpy y fechas de pandas a tipos de Python para no depender de pandas al cargar."""
+    if hasattr(valor, 'isoformat'):
+        return str(valor)
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+
+def _filas(indice):
+    """Reconstruye {símbolo: {columna: valor}} a partir de las columnas del índice."""
+    filas = {simbolo: {} for simbolo in indice['simbolos']}
+    for nombre, valores in indice['columnas'].items():
+        for simbolo, valor in zip(indice['simbolos'], valores.tolist()):
+            if not (isinstance(valor, float) and np.isnan(valor)):
+                filas[simbolo][nombre] = valor
+    return filas
+
+
+def _columnar(filas):
+    """Convierte {símbolo: {columna: valor}} en una lista de símbolos y arrays por columna."""
+    simbolos = sorted(filas)
+    nombres = sorted({columna for fila in filas.values() for columna in fila})
+    columnas = {}
+    for nombre in nombres:
+        valores = [filas[simbolo].get(nombre) for simbolo in simbolos]
+        try:
+            columnas[nombre] = np.array([np.nan if v is None else v for v in valores], dtype=float)
+        except (TypeError, ValueError):
+            columnas[nombre] = np.array(valores, dtype=object)
+    return simbolos, columnas
+
+
+def actualizar_indice(file_paths, ruta_indice=INDICE_POR_DEFECTO):
+    """
+    Actualiza el índice de forma incremental: solo se vuelven a leer los ficheros
+    cuyo tamaño o fecha de modificación han cambiado desde la última vez. El índice
+    resultante contiene solo los ficheros de file_paths: los que ya no están en la
+    lista (o no se pueden leer) salen del universo.
+
+    Returns:
+        tuple: (índice, número de ficheros leídos)
+    """
+    indice = cargar_indice(ruta_indice)
+    anteriores = None
+    filas = {}
+    fuentes = {}
+    leidos = 0
+    for file_path in file_paths:
+        try:
+            huella = _huella(file_path)
+        except OSError as e:
+            print(f"❌ No se puede acceder a '{file_path}': {e}")
+            continue
+        fuente = indice['fuentes'].get(file_path)
+        if fuente is not None and fuente['huella'] == huella:
+            # Fila sin cambios: se toma del índice anterior (solo se reconstruye si hace falta)
+            fuentes[file_path] = fuente
+            continue
+        simbolo = os.path.basename(file_path).split('.')[0]
+        try:
+            fila = ultima_barra(file_path)
+        except Exception as e:
+            print(f"❌ Error al indexar '{file_path}': {e}")
+            continue
+        filas[simbolo] = {str(columna): _valor_simple(valor) for columna, valor in fila.items()}
+        fuentes[file_path] = {'huella': huella, 'simbolo': simbolo}
+        leidos += 1
+
+    if leidos or fuentes.keys() != indice['fuentes'].keys():
+        for file_path, fuente in fuentes.items():
+            if fuente['simbolo'] not in filas:
+                if anteriores is None:
+                    anteriores = _filas(indice)
+                filas[fuente['simbolo']] = anteriores.get(fuente['simbolo'], {})
+        indice['fuentes'] = fuentes
+        indice['simbolos'], indice['columnas'] = _columnar(filas)
+        guardar_indice(indice, ruta_indice)
+    return indice, leidos
+
+
+def rango_percentil(valores):
+    """
+    Rango (1 = valor más alto) y percentil (porcentaje del universo con un valor menor
+    o igual) de cada posición. Los NaN no reciben rango.
+    """
+    rango = np.full(len(valores), np.nan)
+    percentil = np.full(len(valores), np.nan)
+    validos = np.flatnonzero(~np.isnan(valores))
+    if len(validos) == 0:
+        return rango, percentil
+    ordenados = np.sort(valores[validos])
+    # Con empates, el rango es el mejor puesto y el percentil cuenta a todos los empatados
+    rango[validos] = len(validos) - np.searchsorted(ordenados, valores[validos], side='right') + 1
+    percentil[validos] = np.searchsorted(ordenados, valores[validos], side='right') / len(validos) * 100
+    return rango, percentil
+
+
+def consultar(indice, filtro=None, orden=(), columnas=(), limite=None):
+    """
+    Ejecuta una consulta sobre el índice.
+
+    Args:
+        indice (dict): Índice cargado con cargar_indice o actualizar_indice.
+        filtro (str): Condición, p. ej. "RSI < 30 & Compra == 1". Sin filtro se devuelve todo.
+        orden (list): Expresiones de orden ascendente; con el sufijo ' desc' (o un '-'
+            delante) el orden es descendente.
+        columnas (list): Columnas adicionales a mostrar.
+        limite (int): Número máximo de filas.
+
+    Returns:
+        tuple: (cabecera, filas) con el símbolo, cada columna y su rango y percentil.
+    """
+    datos = indice['columnas']
+    simbolos = np.array(indice['simbolos'], dtype=object)
+    forma = (len(simbolos),)
+
+    mostradas = []
+    expresion_filtro = expresiones.compilar(filtro) if filtro else None
+    expresiones_orden = []
+    for texto in orden:
+        descendente = texto.rstrip().lower().endswith(' desc')
+        texto = f"-({texto.rstrip()[:-5]})" if descendente else texto
+        expresiones_orden.append(expresiones.compilar(texto))
+    for expresion in [expresion_filtro, *expresiones_orden]:
+        if expresion is not None:
+            mostradas.extend(sorted(expresion.columnas))
+    mostradas.extend(columnas)
+    mostradas = list(dict.fromkeys(mostradas))
+    for columna in mostradas:
+        if columna not in datos:
+            raise ValueError(f"Columna desconocida: {columna}")
+
+    seleccion = np.ones(forma, dtype=bool)
+    if expresion_filtro is not None:
+        seleccion = expresiones.mascara(expresion_filtro, datos, forma)
+
+    posiciones = np.flatnonzero(seleccion)
+    if expresiones_orden:
+        # np.lexsort ordena por la última clave primero; los NaN quedan al final
+        claves = [expresiones.evaluar(expresion, datos, forma).astype(float)[posiciones]
+                  for expresion in reversed(expresiones_orden)]
+        posiciones = posiciones[np.lexsort(claves)]
+    if limite is not None:
+        posiciones = posiciones[:limite]
+
+    cabecera = ['Simbolo']
+    tabla = [simbolos[posiciones]]
+    for columna in mostradas:
+        valores = datos[columna]
+        cabecera.append(columna)
+        tabla.append(valores[posiciones])
+        if valores.dtype == float:
+            rango, percentil = rango_percentil(valores)
+            cabecera.extend([f"{columna}_rango", f"{columna}_pct"])
+            tabla.extend([rango[posiciones], percentil[posiciones]])
+    return cabecera, list(zip(*tabla))
+
+
+def imprimir_tabla(cabecera, filas):
+    def formato(valor):
+        if isinstance(valor, (float, np.floating)):
+            return "" if np.isnan(valor) else f"{valor:.2f}"
+        return str(valor)
+
+    texto = [cabecera] + [[formato(valor) for valor in fila] for fila in filas]
+    anchos = [max(len(fila[i]) for fila in texto) for i in range(len(cabecera))]
+    for fila in texto:
+        print("  ".join(valor.rjust(ancho) for valor, ancho in zip(fila, anchos)))
+
+
+def main():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description="Cribado de símbolos sobre los últimos valores de los indicadores.")
+    parser.add_argument('filtro', nargs='?', help="Condición, p. ej. \"RSI < 30 & Compra == 1\"")
+    parser.add_argument('--orden', nargs='*', default=[], help="Expresiones de orden (sufijo ' desc' para descendente)")
+    parser.add_argument('--columnas', nargs='*', default=[], help="Columnas adicionales a mostrar")
+    parser.add_argument('--limite', type=int, help="Número máximo de resultados")
+    parser.add_argument('--lista', default=f"lista_indicadores_{hoy}.txt",
+                        help="Lista de ficheros de indicadores con la que se actualiza el índice")
+    parser.add_argument('--indice', default=INDICE_POR_DEFECTO, help="Fichero del índice")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if os.path.exists(args.lista):
+        with open(args.lista, 'r') as file:
+            file_paths = [line.strip() for line in file if line.strip()]
+        indice, leidos = actualizar_indice(file_paths, args.indice)
+        print(f"Índice actualizado: {leidos} ficheros leídos, {len(indice['simbolos'])} símbolos "
+              f"({(time.perf_counter() - inicio) * 1000:.0f} ms).")
+    else:
+        indice = cargar_indice(args.indice)
+
+    if not args.filtro and not args.orden and not args.columnas:
+        return
+
+    inicio = time.perf_counter()
+    try:
+        cabecera, filas = consultar(indice, args.filtro, args.orden, args.columnas, args.limite)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    imprimir_tabla(cabecera, filas)
+    print(f"{len(filas)} de {len(indice['simbolos'])} símbolos ({(time.perf_counter() - inicio) * 1000:.1f} ms).")
+
+
+if __name__ == "__main__":
+    main()
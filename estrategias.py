@@ -0,0 +1,306 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import cache_resultados
+import expresiones
+import manifiesto
+from cribado import imprimir_tabla
+from memoria_compartida import PanelCompartido, mapear
+from kkddtemu2 import backtest_arrays, calcular_senales_arrays
+
+# -----------------------------------
+# Estrategias declarativas: las reglas de entrada, salida, stop loss y take profit se
+# escriben como expresiones sobre columnas de indicadores (ver expresiones.py), se
+# compilan una sola vez y se evalúan como máscaras vectorizadas. Todas las estrategias
+# se ejecutan a la vez sobre cada símbolo: cada una es una columna del backtest
+# vectorizado de kkddtemu2.py (backtest_arrays).
+#
+# Las definiciones se leen de un JSON con una lista de estrategias:
+#   {"nombre": "kkdd_rapida",
+#    "compra": "Stochastic_%K > Stochastic_%D & Temu_20 > Close",
+#    "venta": "Stochastic_%K < Stochastic_%D & Temu_20 < Close",
+#    "stop_loss": "{sl} * Senkou_Span_B", "take_profit": "1.6 * Senkou_Span_A",
+#    "p": 0.5, "parametros": {"sl": [0.8, 0.85, 0.9]}}
+# "parametros" genera una estrategia por cada combinación de valores, sustituyendo
+# {nombre} en las reglas y en p. Uso:
+#   py estrategias.py --definiciones estrategias.json
+# -----------------------------------
+
+Estrategia = namedtuple('Estrategia', ['nombre', 'compra', 'venta', 'stop_loss', 'take_profit', 'p'])
+
+# Las reglas de initialize_dataframe en kkddtemu2.py
+ESTRATEGIA_KKDD = {
+    'nombre': 'kkdd',
+    'compra': "Stochastic_%K > Stochastic_%D & Temu_20 > Close",
+    'venta': "Stochastic_%K < Stochastic_%D & Tenkan_sen > Kijun_sen & Temu_20 < Close",
+    'stop_loss': "0.85 * Senkou_Span_B",
+    'take_profit': "1.6 * Senkou_Span_A",
+    'p': 0.5
+}
+
+REGLAS = ['compra', 'venta', 'stop_loss', 'take_profit']
+
+# Estrategias compiladas en cada proceso de trabajo, por (definiciones, incluir_kkdd)
+_estrategias_proceso = {}
+
+
+def definir(nombre, compra, venta, stop_loss, take_profit, p=0.5):
+    """
+    Compila las reglas de una estrategia.
+
+    Args:
+        nombre (str): Nombre de la estrategia en la tabla comparativa.
+        compra, venta (str): Condiciones de entrada y de salida total.
+        stop_loss, take_profit (str): Expresiones numéricas de los niveles de la posición.
+        p (float): Porcentaje de la posición que se venderá en take profit.
+
+    Raises:
+        ValueError: Si alguna regla no es una expresión válida.
+    """
+    reglas = {}
+    for regla, texto in zip(REGLAS, [compra, venta, stop_loss, take_profit]):
+        try:
+            reglas[regla] = expresiones.compilar(str(texto))
+        except ValueError as e:
+            raise ValueError(f"Estrategia '{nombre}', regla '{regla}': {e}") from None
+    return Estrategia(nombre, p=float(p), **reglas)
+
+
+def expandir(definicion):
+    """
+    Genera las definiciones concretas de una definición con "parametros": una por cada
+    combinación de valores, con los valores sustituidos en las reglas y en el nombre.
+    """
+    parametros = definicion.get('parametros') or {}
+    nombres = list(parametros)
+    for valores in itertools.product(*(parametros[nombre] for nombre in nombres)):
+        sustitucion = dict(zip(nombres, valores))
+        concreta = {clave: valor for clave, valor in definicion.items() if clave != 'parametros'}
+        for regla in REGLAS + ['p']:
+            if regla in concreta:
+                concreta[regla] = str(concreta[regla]).format(**sustitucion)
+        if sustitucion:
+            etiqueta = ",".join(f"{nombre}={valor}" for nombre, valor in sustitucion.items())
+            concreta['nombre'] = f"{definicion['nombre']}[{etiqueta}]"
+        yield concreta
+
+
+def cargar_estrategias(ruta=None, incluir_kkdd=True):
+    """
+    Lee y compila las estrategias de un fichero JSON.
+
+    Returns:
+        list: Estrategias compiladas; la de kkddtemu2.py va primero como referencia.
+    """
+    definiciones = [ESTRATEGIA_KKDD] if incluir_kkdd else []
+    if ruta:
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            definiciones.extend(json.load(archivo))
+
+    estrategias = []
+    nombres = set()
+    for definicion in definiciones:
+        for concreta in expandir(definicion):
+            if concreta['nombre'] in nombres:
+                raise ValueError(f"Estrategia duplicada: {concreta['nombre']}")
+            nombres.add(concreta['nombre'])
+            estrategias.append(definir(concreta['nombre'], concreta['compra'], concreta['venta'],
+                                       concreta['stop_loss'], concreta['take_profit'], concreta.get('p', 0.5)))
+    return estrategias
+
+
+def version_datos():
+    """Versión del código que calcula los arrays de indicadores (este script y kkddtemu2.py)."""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    return cache_resultados.version_codigo(os.path.join(directorio, 'estrategias.py'),
+                                           os.path.join(directorio, 'kkddtemu2.py'))
+
+
+def cargar_datos(file_path, version):
+    """
+    Arrays de indicadores de un símbolo: las columnas numéricas de Sheet1 más los
+    indicadores y señales de kkddtemu2.py. Se guardan en la caché de resultados.
+    """
+    clave = cache_resultados.clave('estrategias', manifiesto.hash_archivo(file_path), version)
+    datos = cache_resultados.obtener('estrategias', clave)
+    if datos is not None:
+        return datos
+
+    df = pd.read_excel(file_path, sheet_name='Sheet1')
+    datos = {}
+    for col in df.columns:
+        if col != 'Date':
+            valores = pd.to_numeric(df[col], errors='coerce')
+            if valores.notna().any():
+                datos[str(col)] = valores.to_numpy(dtype=float)
+    # Como kkddtemu2.py, los precios vacíos se tratan como 0
+    high, low, close = (np.nan_to_num(datos[col], nan=0.0) for col in ['High', 'Low', 'Close'])
+    datos.update(calcular_senales_arrays(high, low, close))
+    cache_resultados.guardar('estrategias', clave, datos)
+    return datos
+
+
+def ejecutar_estrategias(estrategias, datos):
+    """
+    Ejecuta todas las estrategias sobre los datos de un símbolo en un solo backtest.
+
+    Las expresiones repetidas entre estrategias (p. ej. la misma regla de venta con
+    distintos stops) se evalúan una sola vez.
+
+    Returns:
+        dict: Por estrategia, 'Valor_Final', 'Drawdown_Max' (en %), 'Operaciones' y
+            'Tiempo_En_Bolsa' (% de barras con posición).
+    """
+    forma = datos['Close'].shape
+    evaluadas = {}
+
+    def columna(expresion, condicion):
+        if (expresion.texto, condicion) not in evaluadas:
+            if condicion:
+                valor = expresiones.mascara(expresion, datos, forma)
+            else:
+                valor = np.asarray(expresiones.evaluar(expresion, datos, forma), dtype=float)
+            evaluadas[(expresion.texto, condicion)] = valor
+        return evaluadas[(expresion.texto, condicion)]
+
+    reglas = {regla: np.column_stack([columna(getattr(e, regla), regla in ('compra', 'venta'))
+                                      for e in estrategias])
+              for regla in REGLAS}
+    p = np.array([e.p for e in estrategias])
+
+    resultado = backtest_arrays(datos['Close'][:, None], datos['High'][:, None], datos['Low'][:, None],
+                                reglas['compra'], reglas['venta'], reglas['stop_loss'], reglas['take_profit'], p=p)
+    valor = resultado['Valor']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = 1 - valor / np.maximum.accumulate(valor, axis=0)
+    return {
+        'Valor_Final': valor[-1],
+        'Drawdown_Max': np.nanmax(drawdown, axis=0) * 100,
+        'Operaciones': resultado['compra2'].sum(axis=0),
+        'Tiempo_En_Bolsa': (resultado['bolsa'] > 0).mean(axis=0) * 100
+    }
+
+
+def _ejecutar_compartido(vista, argumento):
+    """
+    Tarea de cada proceso de trabajo: lee los arrays del símbolo del panel compartido.
+    Las expresiones compiladas no se pueden enviar por pickle, así que cada proceso
+    compila las definiciones una vez.
+    """
+    simbolo, definiciones, incluir_kkdd = argumento
+    if (definiciones, incluir_kkdd) not in _estrategias_proceso:
+        _estrategias_proceso[(definiciones, incluir_kkdd)] = cargar_estrategias(definiciones, incluir_kkdd)
+    try:
+        return ejecutar_estrategias(_estrategias_proceso[(definiciones, incluir_kkdd)], vista.datos(simbolo))
+    except Exception as e:
+        print(f"Error al procesar {simbolo}: {e}")
+        return None
+
+
+def comparar(estrategias, detalle):
+    """
+    Tabla comparativa de las estrategias sobre todos los símbolos, ordenada por
+    valor final medio.
+    """
+    por_estrategia = detalle.groupby('Estrategia', sort=False)
+    tabla = pd.DataFrame({
+        'Valor_Final_Medio': por_estrategia['Valor_Final'].mean(),
+        'Valor_Final_Mediano': por_estrategia['Valor_Final'].median(),
+        'Drawdown_Medio': por_estrategia['Drawdown_Max'].mean(),
+        'Operaciones': por_estrategia['Operaciones'].sum(),
+        'Tiempo_En_Bolsa': por_estrategia['Tiempo_En_Bolsa'].mean(),
+        '%_Simbolos_Ganadores': por_estrategia['Valor_Final'].apply(lambda v: (v > 100).mean() * 100),
+    })
+    reglas = pd.DataFrame([[e.nombre] + [getattr(e, regla).texto for regla in REGLAS] + [e.p] for e in estrategias],
+                          columns=['Estrategia', *REGLAS, 'p']).set_index('Estrategia')
+    tabla = tabla.join(reglas).sort_values('Valor_Final_Medio', ascending=False)
+    tabla.insert(0, 'Puesto', range(1, len(tabla) + 1))
+    return tabla.reset_index()
+
+
+def main():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description="Compara estrategias declarativas sobre los ficheros de indicadores.")
+    parser.add_argument('--definiciones', default="estrategias.json" if os.path.exists("estrategias.json") else None,
+                        help="JSON con las definiciones de las estrategias")
+    parser.add_argument('--sin-kkdd', action='store_true', help="No incluir la estrategia de kkddtemu2.py")
+    parser.add_argument('--lista', default=f"lista_indicadores_{hoy}.txt", help="Lista de ficheros de indicadores")
+    parser.add_argument('--mostrar', type=int, default=20, help="Estrategias a mostrar por pantalla")
+    parser.add_argument('--salida', default=f"estrategias_{hoy}.xlsx", help="Excel de salida")
+    parser.add_argument('--procesos', type=int, default=1,
+                        help="Procesos en paralelo; con más de uno los datos se comparten en memoria (0 = todos los núcleos)")
+    args = parser.parse_args()
+
+    try:
+        estrategias = cargar_estrategias(args.definiciones, incluir_kkdd=not args.sin_kkdd)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error en las definiciones de estrategias: {e}")
+        return
+    if not estrategias:
+        print("No hay estrategias que ejecutar.")
+        return
+    if not os.path.exists(args.lista):
+        print(f"El fichero {args.lista} no existe.")
+        return
+    with open(args.lista, 'r') as file:
+        file_paths = [line.strip() for line in file if line.strip()]
+
+    print(f"{len(estrategias)} estrategias sobre {len(file_paths)} ficheros")
+    version = version_datos()
+    inicio = time.perf_counter()
+    datos = {}
+    for file_path in file_paths:
+        try:
+            datos[os.path.basename(file_path).split('.')[0]] = cargar_datos(file_path, version)
+        except Exception as e:
+            print(f"Error al procesar {file_path}: {e}")
+
+    if args.procesos == 1:
+        resultados = {}
+        for simbolo, arrays in datos.items():
+            try:
+                resultados[simbolo] = ejecutar_estrategias(estrategias, arrays)
+            except Exception as e:
+                print(f"Error al procesar {simbolo}: {e}")
+    else:
+        # Los procesos hijos importan la tarea desde el módulo (necesario con spawn en Windows)
+        from estrategias import _ejecutar_compartido as tarea
+
+        with PanelCompartido(datos) as panel:
+            argumentos = [(simbolo, args.definiciones, not args.sin_kkdd) for simbolo in datos]
+            resultados = dict(zip(datos, mapear(tarea, panel.descriptor, argumentos, args.procesos or None)))
+
+    filas = []
+    for simbolo, resultado in resultados.items():
+        if resultado is None:
+            continue
+        for k, estrategia in enumerate(estrategias):
+            filas.append({'Variable': simbolo, 'Estrategia': estrategia.nombre,
+                          **{metrica: valores[k] for metrica, valores in resultado.items()}})
+    if not filas:
+        print("No se encontraron datos.")
+        return
+
+    detalle = pd.DataFrame(filas)
+    tabla = comparar(estrategias, detalle)
+    print(f"Backtests completados en {time.perf_counter() - inicio:.1f} s\n")
+    columnas = ['Puesto', 'Estrategia', 'Valor_Final_Medio', 'Valor_Final_Mediano', 'Drawdown_Medio',
+                'Operaciones', '%_Simbolos_Ganadores']
+    imprimir_tabla(columnas, tabla[columnas].head(args.mostrar).itertuples(index=False, name=None))
+
+    with pd.ExcelWriter(args.salida, engine='xlsxwriter') as writer:
+        tabla.round(2).to_excel(writer, sheet_name='comparativa', index=False)
+        detalle.round(2).to_excel(writer, sheet_name='detalle', index=False)
+    print(f"\nResultados guardados en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
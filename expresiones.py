@@ -0,0 +1,240 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# -----------------------------------
+# Pequeño lenguaje de expresiones sobre columnas de indicadores, p. ej.
+#   RSI < 30 & Compra == 1
+#   Stochastic_%K > Stochastic_%D and (Temu_20 > Close or not Venta == 1)
+# Las expresiones se compilan una sola vez y se evalúan de forma vectorizada
+# sobre arrays de numpy (una posición por símbolo, por fecha o por ambos).
+#
+# Gramática (de menor a mayor precedencia):
+#   or:      and (('|' | 'or') and)*
+#   and:     not (('&' | 'and') not)*
+#   not:     ('~' | 'not') not | cmp
+#   cmp:     suma (('<' | '<=' | '>' | '>=' | '==' | '!=') suma)?
+#   suma:    prod (('+' | '-') prod)*
+#   prod:    unario (('*' | '/') unario)*
+#   unario:  '-' unario | atomo
+#   atomo:   número | 'texto' | columna | `columna con espacios` | función(expr, ...) | (expr)
+# -----------------------------------
+
+ExpresionCompilada = namedtuple('ExpresionCompilada', ['texto', 'columnas', 'funcion'])
+
+FUNCIONES = {
+    'abs': np.abs,
+    'min': np.minimum,
+    'max': np.maximum,
+    'log': np.log,
+    'sqrt': np.sqrt,
+    'isnull': lambda x: np.isnan(np.asarray(x, dtype=float)),
+}
+
+_COMPARADORES = {
+    '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+_PALABRAS = {'and': '&', 'or': '|', 'not': '~'}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<numero>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)
+      | (?P<texto>'[^']*'|"[^"]*")
+      | `(?P<citado>[^`]+)`
+      | (?P<nombre>[^\W\d][\w%]*)
+      | (?P<operador><=|>=|==|!=|[<>&|~+\-*/(),])
+    )""", re.VERBOSE)
+
+
+def _tokenizar(texto):
+    """Divide la expresión en tokens (tipo, valor)."""
+    tokens = []
+    posicion = 0
+    texto = texto.rstrip()
+    while posicion < len(texto):
+        coincidencia = _TOKEN.match(texto, posicion)
+        if not coincidencia:
+            raise ValueError(f"Carácter inesperado en la posición {posicion}: {texto[posicion:]!r}")
+        posicion = coincidencia.end()
+        tipo = coincidencia.lastgroup
+        valor = coincidencia.group(tipo)
+        if tipo == 'citado':
+            tipo = 'nombre'
+        elif tipo == 'nombre' and valor.lower() in _PALABRAS:
+            tipo, valor = 'operador', _PALABRAS[valor.lower()]
+        tokens.append((tipo, valor))
+    return tokens
+
+
+class _Parser:
+    """Parser descendente recursivo que traduce los tokens a funciones de numpy."""
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.tokens = _tokenizar(texto)
+        self.posicion = 0
+        self.columnas = set()
+
+    def _actual(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    def _acepta(self, *operadores):
+        tipo, valor = self._actual()
+        if tipo == 'operador' and valor in operadores:
+            self.posicion += 1
+            return valor
+        return None
+
+    def _espera(self, operador):
+        if not self._acepta(operador):
+            raise ValueError(f"Se esperaba '{operador}' en la expresión: {self.texto!r}")
+
+    def compilar(self):
+        if not self.tokens:
+            raise ValueError("La expresión está vacía.")
+        funcion = self._or()
+        if self.posicion < len(self.tokens):
+            raise ValueError(f"Token inesperado {self.tokens[self.posicion][1]!r} en la expresión: {self.texto!r}")
+        return funcion
+
+    def _binario(self, siguiente, operadores):
+        izquierda = siguiente()
+        while True:
+            operador = self._acepta(*operadores)
+            if operador is None:
+                return izquierda
+            derecha = siguiente()
+            izquierda = (lambda op, a, b: lambda datos: op(a(datos), b(datos)))(operadores[operador], izquierda, derecha)
+
+    def _or(self):
+        return self._binario(self._and, {'|': _logico(np.logical_or)})
+
+    def _and(self):
+        return self._binario(self._not, {'&': _logico(np.logical_and)})
+
+    def _not(self):
+        if self._acepta('~'):
+            operando = self._not()
+            return lambda datos: np.logical_not(_booleano(operando(datos)))
+        return self._cmp()
+
+    def _cmp(self):
+        izquierda = self._suma()
+        operador = self._acepta(*_COMPARADORES)
+        if operador is None:
+            return izquierda
+        derecha = self._suma()
+        comparar = _COMPARADORES[operador]
+        return lambda datos: comparar(izquierda(datos), derecha(datos))
+
+    def _suma(self):
+        return self._binario(self._prod, {'+': np.add, '-': np.subtract})
+
+    def _prod(self):
+        return self._binario(self._unario, {'*': np.multiply, '/': np.true_divide})
+
+    def _unario(self):
+        if self._acepta('-'):
+            operando = self._unario()
+            return lambda datos: np.negative(operando(datos))
+        return self._atomo()
+
+    def _atomo(self):
+        tipo, valor = self._actual()
+        if tipo is None:
+            raise ValueError(f"La expresión termina de forma inesperada: {self.texto!r}")
+        self.posicion += 1
+        if tipo == 'numero':
+            numero = float(valor)
+            return lambda datos: numero
+        if tipo == 'texto':
+            cadena = valor[1:-1]
+            return lambda datos: cadena
+        if tipo == 'nombre':
+            if self._acepta('('):
+                return self._funcion(valor)
+            self.columnas.add(valor)
+            return lambda datos: _columna(datos, valor)
+        if valor == '(':
+            funcion = self._or()
+            self._espera(')')
+            return funcion
+        raise ValueError(f"Token inesperado {valor!r} en la expresión: {self.texto!r}")
+
+    def _funcion(self, nombre):
+        if nombre.lower() not in FUNCIONES:
+            raise ValueError(f"Función desconocida: {nombre}")
+        funcion = FUNCIONES[nombre.lower()]
+        argumentos = [self._or()]
+        while self._acepta(','):
+            argumentos.append(self._or())
+        self._espera(')')
+        return lambda datos: funcion(*(argumento(datos) for argumento in argumentos))
+
+
+def _columna(datos, nombre):
+    try:
+        return datos[nombre]
+    except KeyError:
+        raise ValueError(f"Columna desconocida: {nombre}") from None
+
+
+def _booleano(valor):
+    """Interpreta un valor como condición: los números distintos de 0 (y no NaN) son ciertos."""
+    valor = np.asarray(valor)
+    if valor.dtype == bool:
+        return valor
+    if valor.dtype.kind in 'iuf':
+        return np.nan_to_num(valor, nan=0.0) != 0
+    return valor.astype(bool)
+
+
+def _logico(operador):
+    return lambda a, b: operador(_booleano(a), _booleano(b))
+
+
+def compilar(texto):
+    """
+    Compila una expresión de texto.
+
+    Args:
+        texto (str): La expresión, p. ej. "RSI < 30 & Compra == 1".
+
+    Returns:
+        ExpresionCompilada: Con el texto, el conjunto de columnas que usa y la función
+            que la evalúa sobre un diccionario {columna: array}.
+
+    Raises:
+        ValueError: Si la expresión no es válida.
+    """
+    parser = _Parser(texto)
+    funcion = parser.compilar()
+    return ExpresionCompilada(texto, frozenset(parser.columnas), funcion)
+
+
+def evaluar(expresion, datos, forma=None):
+    """
+    Evalúa una expresión (texto o compilada) sobre un diccionario de arrays.
+
+    Args:
+        expresion (str | ExpresionCompilada): La expresión.
+        datos (Mapping): Arrays de numpy indexados por nombre de columna.
+        forma (tuple): Forma a la que se expande el resultado si la expresión es constante.
+
+    Returns:
+        numpy.ndarray: El resultado vectorizado.
+    """
+    if isinstance(expresion, str):
+        expresion = compilar(expresion)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultado = np.asarray(expresion.funcion(datos))
+    if forma is not None and resultado.shape != forma:
+        resultado = np.broadcast_to(resultado, forma)
+    return resultado
+
+
+def mascara(expresion, datos, forma=None):
+    """Evalúa una condición y devuelve una máscara booleana (NaN cuenta como falso)."""
+    return _booleano(evaluar(expresion, datos, forma))
@@ -0,0 +1,217 @@
+import argparse
+import math
+import os
+from datetime import datetime
+
+import pandas as pd
+import xlsxwriter
+
+from cribado import hoja_kkddb2_reciente
+
+# -----------------------------------
+# Informe final en una sola pasada: agrega las hojas kkddb2 de cada fichero,
+# calcula el resumen Rkkddb2 y escribe todo con xlsxwriter en modo constant_memory,
+# fila a fila, sin cargar ni reescribir el libro.
+# -----------------------------------
+
+# Columnas de la hoja kkddb2 que se llevan al agregado (las mismas que 7agregadob.py)
+COLUMNAS_KKDDB2 = ["compra2", "Compra", "Venta", "ventap", "Stop_Loss_Compra", "Take_profit_Compra",
+                   "Close", "Precio_Compra", "cta", "bolsa", "Valor"]
+
+# Formato condicional de las columnas de señales: columna -> color de fondo cuando vale 1
+COLORES_SENALES = {'Compra': '#C6EFCE', 'Venta': '#FFC7CE'}
+
+# Hojas adicionales que se incluyen si otra etapa ha generado el fichero del día
+HOJAS_EXTRA = {
+    'Correlaciones': "correlaciones_{fecha}.csv",
+    'Betas_Macro': "betas_macro_{fecha}.csv",
+}
+
+
+def leer_kkddb2(file_path, hoja=None):
+    """
+    Lee las columnas de COLUMNAS_KKDDB2 de la hoja kkddb2 de un fichero de indicadores.
+    Por defecto, de la más reciente (kkddb2, kkddb2_1, ...), como cribado.py.
+
+    Returns:
+        DataFrame o None si la hoja o alguna columna no existe.
+    """
+    xl = pd.ExcelFile(file_path)
+    hoja = hoja or hoja_kkddb2_reciente(xl.sheet_names)
+    if hoja not in xl.sheet_names:
+        print(f"El archivo {file_path} no contiene una hoja '{hoja or 'kkddb2'}'. Ignorando.")
+        return None
+
+    df = xl.parse(hoja, usecols=lambda col: str(col).strip() in COLUMNAS_KKDDB2)
+    df.columns = df.columns.str.strip()
+    missing_columns = [col for col in COLUMNAS_KKDDB2 if col not in df.columns]
+    if missing_columns:
+        print(f"El archivo {file_path} falta las siguientes columnas: {', '.join(missing_columns)}. Ignorando.")
+        return None
+    return df[COLUMNAS_KKDDB2]
+
+
+def leer_tablas(file_paths):
+    """
+    Lee la hoja kkddb2 de cada fichero y las devuelve indexadas por el prefijo
+    del nombre del fichero (antes del primer punto), como en 7agregadob.py.
+    """
+    tablas = {}
+    for file_path in file_paths:
+        print(f"Procesando archivo: {file_path}")
+        try:
+            df = leer_kkddb2(file_path)
+        except Exception as e:
+            print(f"Error al procesar el archivo {file_path}: {e}")
+            continue
+        if df is not None:
+            tablas[os.path.basename(file_path).split('.')[0]] = df
+    return tablas
+
+
+def _ultimo_valor(serie, primero=False):
+    """Último (o primer) valor no nulo de una serie, o None si no hay ninguno."""
+    valores = serie.dropna()
+    if valores.empty:
+        return None
+    return valores.iloc[0] if primero else valores.iloc[-1]
+
+
+def construir_resumen(tablas):
+    """
+    Construye la hoja Rkkddb2: último valor no nulo de cada columna por variable
+    y el primer Close, con el mismo formato que 8resumenb.py.
+    """
+    filas = []
+    for variable in sorted(tablas):
+        df = tablas[variable]
+        row = {'Variable': variable}
+        for category in COLUMNAS_KKDDB2:
+            row[category] = _ultimo_valor(df[category])
+        row['First_Close'] = _ultimo_valor(df['Close'], primero=True)
+        filas.append(row)
+    return pd.DataFrame(filas, columns=['Variable', *COLUMNAS_KKDDB2, 'First_Close'])
+
+
+def _celda(valor):
+    """Adapta un valor para xlsxwriter: los nulos (NaN, NaT, None) se dejan en blanco."""
+    if valor is None or valor is pd.NaT:
+        return None
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    if hasattr(valor, 'item') and not isinstance(valor, pd.Timestamp):
+        # Escalares numpy
+        return _celda(valor.item())
+    return valor
+
+
+def filas_agregado(tablas):
+    """
+    Genera la cabecera y las filas de la hoja kkddb2 agregada sin construir el
+    DataFrame combinado: cada fila une la fila i de cada variable.
+    """
+    variables = sorted(tablas)
+    cabecera = [f"{variable}_{col}" for variable in variables for col in COLUMNAS_KKDDB2]
+    valores = [tablas[variable].to_numpy(dtype=object) for variable in variables]
+    vacio = [None] * len(COLUMNAS_KKDDB2)
+    num_filas = max((len(v) for v in valores), default=0)
+
+    def filas():
+        for i in range(num_filas):
+            fila = []
+            for v in valores:
+                fila.extend(v[i] if i < len(v) else vacio)
+            yield fila
+
+    return cabecera, filas()
+
+
+def filas_dataframe(df):
+    """Cabecera y filas de un DataFrame para escribir_hoja."""
+    return [str(col) for col in df.columns], df.itertuples(index=False, name=None)
+
+
+def escribir_hoja(libro, nombre, cabecera, filas, formatos_senales=None):
+    """
+    Escribe una hoja fila a fila y aplica el formato condicional a las columnas
+    de señales (las que terminan en Compra o Venta).
+
+    Returns:
+        int: Número de filas de datos escritas.
+    """
+    hoja = libro.add_worksheet(nombre)
+    hoja.write_row(0, 0, cabecera)
+    num_filas = 0
+    for num_filas, fila in enumerate(filas, start=1):
+        hoja.write_row(num_filas, 0, [_celda(valor) for valor in fila])
+
+    if formatos_senales and num_filas:
+        for col, nombre_col in enumerate(cabecera):
+            for senal, formato in formatos_senales.items():
+                if nombre_col == senal or nombre_col.endswith(f"_{senal}"):
+                    hoja.conditional_format(1, col, num_filas, col, {
+                        'type': 'cell', 'criteria': '==', 'value': 1, 'format': formato
+                    })
+    hoja.freeze_panes(1, 0)
+    return num_filas
+
+
+def escribir_informe(output_file, tablas, hojas_extra=None, formato_condicional=True):
+    """
+    Escribe el informe final en una sola pasada con memoria constante.
+
+    Args:
+        output_file (str): Ruta del Excel de salida (se sobrescribe).
+        tablas (dict): Hojas kkddb2 de cada variable, como devuelve leer_tablas.
+        hojas_extra (dict): Hojas adicionales {nombre: DataFrame} que se añaden al final.
+        formato_condicional (bool): Resaltar las señales de Compra y Venta.
+    """
+    libro = xlsxwriter.Workbook(output_file, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd'
+    })
+    formatos_senales = None
+    if formato_condicional:
+        formatos_senales = {senal: libro.add_format({'bg_color': color})
+                            for senal, color in COLORES_SENALES.items()}
+
+    cabecera, filas = filas_agregado(tablas)
+    escribir_hoja(libro, 'kkddb2', cabecera, filas, formatos_senales)
+    escribir_hoja(libro, 'Rkkddb2', *filas_dataframe(construir_resumen(tablas)), formatos_senales)
+    for nombre, df in (hojas_extra or {}).items():
+        escribir_hoja(libro, nombre, *filas_dataframe(df))
+    libro.close()
+
+
+def main():
+    today = datetime.now().strftime("%Y%m%d")
+    parser = argparse.ArgumentParser(description="Genera el informe agregado con el resumen Rkkddb2.")
+    parser.add_argument('--lista', default=f"lista_indicadores_{today}.txt",
+                        help="Fichero de texto con las rutas de los Excel de indicadores")
+    parser.add_argument('--salida', default=f"agregado_{today}.xlsx", help="Excel de salida")
+    parser.add_argument('--sin-formato', action='store_true', help="No aplicar formato condicional")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.lista):
+        print(f"El fichero {args.lista} no existe.")
+        return
+    with open(args.lista, "r") as file:
+        file_paths = [line.strip() for line in file if line.strip()]
+
+    tablas = leer_tablas(file_paths)
+    if not tablas:
+        print("No se encontraron datos para guardar.")
+        return
+
+    hojas_extra = {}
+    for nombre, patron in HOJAS_EXTRA.items():
+        ruta = patron.format(fecha=today)
+        if os.path.exists(ruta):
+            hojas_extra[nombre] = pd.read_csv(ruta)
+
+    escribir_informe(args.salida, tablas, hojas_extra, formato_condicional=not args.sin_formato)
+    print(f"Informe guardado en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import builtins
+import os
+import runpy
+import sys
+import time
+from datetime import datetime
+
+# -----------------------------------
+# Punto de entrada único del pipeline kkdd.
+# Cada etapa se ejecuta en el mismo intérprete y las dependencias pesadas
+# (pandas, TA-Lib, yfinance, openpyxl) solo se importan en los subcomandos que las usan.
+# -----------------------------------
+
+INICIO = time.perf_counter()
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Etapas del pipeline: (subcomando, script, ayuda)
+ETAPAS = [
+    ('descargar', '1ibex.py', "Descarga los datos de Yahoo Finance en la carpeta del día"),
+    ('listar', '2lista.py', "Genera lista_AAAAMMDD.txt con los ficheros descargados"),
+    ('normalizar', '3afilas2.py', "Limpia las filas de cabecera de los ficheros descargados"),
+    ('indicadores', '4indicadores8.py', "Calcula los indicadores técnicos"),
+    ('listar-indicadores', '5lista_indicadores.py', "Genera lista_indicadores_AAAAMMDD.txt"),
+    ('correlaciones', 'correlaciones.py', "Correlaciones, betas macro y límites de posición móviles"),
+    ('backtest', 'kkddtemu2.py', "Ejecuta la mecánica de trading sobre cada fichero"),
+    ('agregar', '7agregadob.py', "Agrega las hojas kkddb2 en agregado_AAAAMMDD.xlsx"),
+    ('resumir', '8resumenb.py', "Crea la hoja resumen Rkkddb2"),
+    ('informe', 'informe.py', "Escribe el agregado y el resumen Rkkddb2 en una sola pasada"),
+    ('cribar', 'cribado.py', "Actualiza el índice de cribado y consulta los últimos valores"),
+    ('robustez', 'robustez.py', "Pruebas Monte Carlo de la mecánica de trading"),
+    ('estrategias', 'estrategias.py', "Compara estrategias declarativas en un solo backtest vectorizado"),
+    ('memoria', 'memoria_compartida.py', "Comparativa del panel en memoria compartida frente a pickle"),
+    ('historico', 'almacen.py', "Histórico versionado: migrar, leer, exportar y compactar"),
+    ('manifiesto', 'manifiesto.py', "Actualiza y muestra el manifiesto de ficheros del día"),
+    ('cache', 'cache_resultados.py', "Estadísticas, purga y desalojo de la caché de resultados"),
+]
+
+# Etapas que ejecuta `todo`: el informe sustituye a agregar + resumir
+PIPELINE = ['descargar', 'listar', 'normalizar', 'indicadores', 'listar-indicadores', 'correlaciones', 'backtest', 'cribar', 'informe']
+
+# Tiempo de importación de cada módulo de primer nivel, en segundos
+tiempos_importacion = {}
+_profundidad = [0]
+
+
+def medir_importaciones():
+    """
+    Envuelve builtins.__import__ para medir el tiempo de cada importación de primer
+    nivel que todavía no estaba cargada (incluye el de sus dependencias).
+    """
+    importar_original = builtins.__import__
+
+    def importar(name, globals=None, locals=None, fromlist=(), level=0):
+        raiz = name.partition('.')[0]
+        if level != 0 or _profundidad[0] > 0 or raiz in sys.modules:
+            return importar_original(name, globals, locals, fromlist, level)
+        _profundidad[0] += 1
+        inicio = time.perf_counter()
+        try:
+            return importar_original(name, globals, locals, fromlist, level)
+        finally:
+            _profundidad[0] -= 1
+            tiempos_importacion[raiz] = tiempos_importacion.get(raiz, 0.0) + time.perf_counter() - inicio
+
+    builtins.__import__ = importar
+
+
+def imprimir_tiempos():
+    """Imprime el desglose de tiempos de importación y el tiempo total."""
+    total = time.perf_counter() - INICIO
+    importaciones = sum(tiempos_importacion.values())
+    print("\n⏱️ Tiempos de importación:", file=sys.stderr)
+    for modulo, segundos in sorted(tiempos_importacion.items(), key=lambda x: -x[1]):
+        if segundos >= 0.001:
+            print(f"  {modulo:<20} {segundos * 1000:9.1f} ms", file=sys.stderr)
+    print(f"  {'(importaciones)':<20} {importaciones * 1000:9.1f} ms", file=sys.stderr)
+    print(f"  {'(total)':<20} {total * 1000:9.1f} ms", file=sys.stderr)
+
+
+def ejecutar_script(script, argumentos=()):
+    """Ejecuta un script del pipeline como si se lanzara con `py script`."""
+    ruta = os.path.join(DIRECTORIO, script)
+    argv_original = sys.argv
+    sys.argv = [ruta, *argumentos]
+    try:
+        runpy.run_path(ruta, run_name='__main__')
+    finally:
+        sys.argv = argv_original
+
+
+def comando_etapa(args):
+    ejecutar_script(args.script, args.argumentos)
+
+
+def comando_todo(args):
+    """Ejecuta todas las etapas en orden en un único intérprete."""
+    scripts = {nombre: script for nombre, script, _ in ETAPAS}
+    for nombre in PIPELINE:
+        if nombre in args.omitir:
+            continue
+        script = scripts[nombre]
+        print(f"\n▶️ {nombre} ({script})")
+        inicio = time.perf_counter()
+        ejecutar_script(script)
+        print(f"✅ {nombre} completado en {time.perf_counter() - inicio:.1f} s")
+
+
+def comando_estado(args):
+    """Muestra qué salidas del pipeline existen para una fecha."""
+    fecha = args.fecha
+    directorio = os.path.join(os.getcwd(), fecha)
+    if os.path.isdir(directorio):
+        archivos = os.listdir(directorio)
+        indicadores = [archivo for archivo in archivos if "indicadores" in archivo]
+        print(f"📁 {directorio}: {len(archivos) - len(indicadores)} ficheros de datos, "
+              f"{len(indicadores)} ficheros de indicadores")
+    else:
+        print(f"📁 {directorio}: no existe")
+
+    for nombre in [f"lista_{fecha}.txt", f"lista_indicadores_{fecha}.txt", f"agregado_{fecha}.xlsx"]:
+        ruta = os.path.join(os.getcwd(), nombre)
+        if os.path.exists(ruta):
+            modificado = datetime.fromtimestamp(os.path.getmtime(ruta)).strftime('%H:%M:%S')
+            print(f"✅ {nombre} ({os.path.getsize(ruta)} bytes, {modificado})")
+        else:
+            print(f"⚠️ {nombre} no existe")
+
+
+def comando_ver_resumen(args):
+    """Imprime la hoja Rkkddb2 del agregado sin cargar pandas."""
+    from openpyxl import load_workbook
+
+    ruta = args.archivo or f"agregado_{args.fecha}.xlsx"
+    if not os.path.exists(ruta):
+        print(f"El archivo {ruta} no existe.")
+        return
+    libro = load_workbook(ruta, read_only=True, data_only=True)
+    hojas = [hoja for hoja in libro.sheetnames if hoja.startswith('Rkkddb2')]
+    if not hojas:
+        print(f"El archivo {ruta} no contiene una hoja 'Rkkddb2'.")
+        return
+    # La última hoja Rkkddb2_N es la más reciente
+    for fila in libro[hojas[-1]].iter_rows(values_only=True):
+        print("\t".join("" if valor is None else str(round(valor, 2) if isinstance(valor, float) else valor)
+                        for valor in fila))
+    libro.close()
+
+
+def comando_servicio(args):
+    ejecutar_script('servicio_senales.py', args.argumentos)
+
+
+def crear_parser():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(prog='kkdd', description="Pipeline de trading kkdd.")
+    parser.add_argument('-t', '--tiempos', action='store_true',
+                        help="Imprime el desglose de tiempos de importación al terminar")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    for nombre, script, ayuda in ETAPAS:
+        sub = subparsers.add_parser(nombre, help=ayuda, add_help=False)
+        sub.set_defaults(funcion=comando_etapa, script=script)
+
+    sub = subparsers.add_parser('todo', help="Ejecuta todas las etapas en orden")
+    sub.add_argument('--omitir', nargs='*', default=[], choices=PIPELINE,
+                     help="Etapas a omitir")
+    sub.set_defaults(funcion=comando_todo)
+
+    sub = subparsers.add_parser('estado', help="Muestra las salidas existentes del pipeline")
+    sub.add_argument('--fecha', default=hoy, help="Fecha AAAAMMDD (por defecto hoy)")
+    sub.set_defaults(funcion=comando_estado)
+
+    sub = subparsers.add_parser('ver-resumen', help="Imprime la hoja Rkkddb2 del agregado")
+    sub.add_argument('--fecha', default=hoy, help="Fecha AAAAMMDD (por defecto hoy)")
+    sub.add_argument('--archivo', help="Fichero Excel a leer en lugar de agregado_AAAAMMDD.xlsx")
+    sub.set_defaults(funcion=comando_ver_resumen)
+
+    sub = subparsers.add_parser('servicio', help="Arranca el servicio de señales en vivo", add_help=False)
+    sub.set_defaults(funcion=comando_servicio)
+
+    return parser
+
+
+def main():
+    medir_importaciones()
+    # Todo lo que sigue al subcomando de una etapa se pasa tal cual a su script
+    argv = sys.argv[1:]
+    reenviables = {nombre for nombre, _, _ in ETAPAS} | {'servicio'}
+    # El subcomando es el primer argumento tras las opciones globales; solo se corta ahí
+    # (los nombres de etapa que aparecen después, p. ej. en todo --omitir, son valores)
+    corte = next((i for i, arg in enumerate(argv) if not arg.startswith('-')), None)
+    if corte is not None and argv[corte] in reenviables:
+        args = crear_parser().parse_args(argv[:corte + 1])
+        args.argumentos = argv[corte + 1:]
+    else:
+        args = crear_parser().parse_args(argv)
+    try:
+        args.funcion(args)
+    finally:
+        if args.tiempos:
+            imprimir_tiempos()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1 @@
-py 1ibex.py
-py 2lista.py
-py 3afilas2.py
-py 4indicadores8.py
-py 5lista_indicadores.py
-py kkddtemu2.py
-py 7agregadob.py
-py 8resumenb.py
-
+py kkdd.py todo
@@ -1,8 +1,12 @@
 from datetime import datetime
+import os
 import pandas as pd
 import openpyxl
 import numpy as np
 
+import cache_resultados
+import manifiesto
+
 def calculate_ichimoku(df):
     """Calcula los componentes del Ichimoku Kinko Hyo"""
     
@@ -82,10 +86,22 @@ def initialize_dataframe(df):
     
     return kkddb2_df
 
+def importe_compra(cta, bolsa, limite):
+    """
+    Efectivo a invertir en una compra: todo el efectivo salvo que la exposición supere
+    el límite de posición (fracción del valor total de la cuenta).
+    """
+    return min(max(limite * (cta + bolsa) - bolsa, 0), cta)
+
 def process_trading_logic(kkddb2_df):
-    """Implementa la lógica de trading con gestión mejorada de stop loss y take profit"""
+    """
+    Implementa la lógica de trading con gestión mejorada de stop loss y take profit.
+    Si existe la columna 'Limite_Posicion' (ver correlaciones.py), cada compra solo
+    invierte hasta esa fracción del valor de la cuenta.
+    """
     en_bolsa = False
     p = 0.5  # Porcentaje de la posición que se venderá en take profit
+    con_limite = 'Limite_Posicion' in kkddb2_df.columns
     
     for i in range(1, len(kkddb2_df)):
         # Actualizar cuenta y bolsa
@@ -99,10 +115,15 @@ def process_trading_logic(kkddb2_df):
         
         # Lógica de compra
         if kkddb2_df.loc[i, 'Compra'] == 1:
-            if kkddb2_df.loc[i, 'cta'] > 0:
+            # Importe de la compra: todo el efectivo o, con límite de posición, hasta el límite
+            importe = kkddb2_df.loc[i, 'cta']
+            if con_limite and importe > 0:
+                importe = importe_compra(importe, kkddb2_df.loc[i - 1, 'bolsa'],
+                                         kkddb2_df.loc[i, 'Limite_Posicion'])
+            if importe > 0:
                 # Ejecutar compra
-                kkddb2_df.loc[i, 'bolsa'] = kkddb2_df.loc[i, 'cta'] + kkddb2_df.loc[i - 1, 'bolsa']
-                kkddb2_df.loc[i, 'cta'] = 0
+                kkddb2_df.loc[i, 'bolsa'] = importe + kkddb2_df.loc[i - 1, 'bolsa']
+                kkddb2_df.loc[i, 'cta'] = kkddb2_df.loc[i, 'cta'] - importe
                 kkddb2_df.loc[i, 'Precio_Compra'] = kkddb2_df.loc[i, 'Close']
                 # Memorizar Stop Loss y Take Profit de entrada
                 kkddb2_df.loc[i, 'Stop_Loss_Compra'] = kkddb2_df.loc[i, 'Stop_Loss']
@@ -159,6 +180,249 @@ def process_trading_logic(kkddb2_df):
     
     return kkddb2_df
 
+def nuevo_estado_trading(cta=100.0):
+    """Crea el estado inicial de la posición para la versión incremental de la lógica de trading"""
+    return {
+        'cta': cta,
+        'bolsa': 0.0,
+        'Close': None,
+        'en_bolsa': False,
+        'Stop_Loss_Compra': None,
+        'Take_profit_Compra': None,
+        'Precio_Compra': None,
+        'compra2': 0,
+        'ventap': 0.0,
+        'Rentabilidad': 0.0,
+        'Valor': cta
+    }
+
+def paso_trading(estado, barra, p=0.5):
+    """
+    Aplica la lógica de process_trading_logic a una sola barra nueva.
+
+    Args:
+        estado (dict): Estado de la posición tras la barra anterior (ver nuevo_estado_trading).
+            Se actualiza in situ.
+        barra (dict): Valores de la barra con las claves 'Close', 'High', 'Low', 'Compra',
+            'Venta', 'Stop_Loss' y 'Take_profit' y, opcionalmente, 'Limite_Posicion'.
+        p (float): Porcentaje de la posición que se venderá en take profit.
+
+    Returns:
+        dict: El estado actualizado, equivalente a la fila de kkddb2 de esa barra.
+    """
+    # La primera barra solo fija el precio de referencia, igual que el bucle que empieza en 1
+    if estado['Close'] is None:
+        estado['Close'] = barra['Close']
+        return estado
+
+    en_bolsa = estado['en_bolsa']
+    close = barra['Close']
+    cta = estado['cta']
+    bolsa_anterior = estado['bolsa']
+    bolsa = bolsa_anterior * close / estado['Close'] if estado['Close'] else np.nan
+
+    # Los niveles de la posición solo se arrastran mientras estamos en bolsa
+    stop_loss_compra = estado['Stop_Loss_Compra'] if en_bolsa else None
+    take_profit_compra = estado['Take_profit_Compra'] if en_bolsa else None
+    precio_compra = None
+    compra2 = 0
+    ventap = 0.0
+
+    # Lógica de compra
+    if barra['Compra'] == 1:
+        # Sin importe que invertir (sin efectivo o con el límite alcanzado) solo se mejora el stop
+        importe = importe_compra(cta, bolsa_anterior, barra.get('Limite_Posicion', 1.0)) if cta > 0 else 0
+        if importe > 0:
+            bolsa = importe + bolsa_anterior
+            cta = cta - importe
+            precio_compra = close
+            stop_loss_compra = barra['Stop_Loss']
+            take_profit_compra = barra['Take_profit']
+            if not en_bolsa:
+                compra2 = 1
+                en_bolsa = True
+        elif stop_loss_compra is None or barra['Stop_Loss'] > stop_loss_compra:
+            stop_loss_compra = barra['Stop_Loss']
+
+    # Lógica de take profit (venta parcial)
+    elif (en_bolsa and
+          pd.notnull(barra['High']) and
+          pd.notnull(take_profit_compra) and
+          barra['High'] >= take_profit_compra):
+        venta_parcial = p * bolsa
+        cta = cta + venta_parcial
+        bolsa = (1 - p) * bolsa
+        ventap = p
+        if barra['Stop_Loss'] > stop_loss_compra:
+            stop_loss_compra = barra['Stop_Loss']
+        take_profit_compra = barra['Take_profit']
+
+    # Lógica de venta total (por señal de venta o stop loss)
+    elif (en_bolsa and
+          (barra['Venta'] == 1 or
+           (pd.notnull(barra['Low']) and
+            pd.notnull(stop_loss_compra) and
+            barra['Low'] <= stop_loss_compra))):
+        cta += bolsa
+        bolsa = 0
+        stop_loss_compra = None
+        take_profit_compra = None
+        precio_compra = None
+        en_bolsa = False
+
+    # Calcular rentabilidad si estamos en posición
+    if en_bolsa and pd.notnull(precio_compra):
+        rentabilidad = ((close / precio_compra) - 1) * 100
+    else:
+        rentabilidad = 0
+
+    estado.update({
+        'cta': cta,
+        'bolsa': bolsa,
+        'Close': close,
+        'en_bolsa': en_bolsa,
+        'Stop_Loss_Compra': stop_loss_compra,
+        'Take_profit_Compra': take_profit_compra,
+        'Precio_Compra': precio_compra,
+        'compra2': compra2,
+        'ventap': ventap,
+        'Rentabilidad': rentabilidad,
+        'Valor': cta + bolsa
+    })
+    return estado
+
+def _rolling_arrays(valores, period, funcion):
+    """
+    Ventana móvil a lo largo del eje 0 de un array (fechas x caminos), con la misma
+    semántica que rolling(window=period): NaN si faltan datos o hay algún NaN.
+    `funcion` es una ufunc binaria (np.maximum, np.minimum o np.add).
+    """
+    resultado = np.full(valores.shape, np.nan)
+    if len(valores) < period:
+        return resultado
+    acumulado = valores[period - 1:].copy()
+    for j in range(1, period):
+        acumulado = funcion(acumulado, valores[period - 1 - j:len(valores) - j])
+    resultado[period - 1:] = acumulado
+    return resultado
+
+def calcular_senales_arrays(high, low, close):
+    """
+    Versión vectorizada de initialize_dataframe para arrays de forma (fechas, caminos):
+    calcula Ichimoku, Temu_20, Stochastic, las señales y los niveles de Stop Loss y Take Profit
+    de todos los caminos a la vez.
+
+    Returns:
+        dict: Arrays con los mismos nombres que las columnas de kkddb2.
+    """
+    high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+
+    def calc_midpoint(period):
+        return (_rolling_arrays(high, period, np.maximum) + _rolling_arrays(low, period, np.minimum)) / 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = {
+            'Close': close, 'High': high, 'Low': low,
+            'Tenkan_sen': calc_midpoint(9),
+            'Kijun_sen': calc_midpoint(26),
+            'Senkou_Span_B': calc_midpoint(52),
+            'Temu_20': _rolling_arrays(close, 20, np.add) / 20,
+        }
+        s['Senkou_Span_A'] = (s['Tenkan_sen'] + s['Kijun_sen']) / 2
+        low_min = _rolling_arrays(low, 14, np.minimum)
+        high_max = _rolling_arrays(high, 14, np.maximum)
+        s['Stochastic_%K'] = (close - low_min) / (high_max - low_min) * 100
+        s['Stochastic_%D'] = _rolling_arrays(s['Stochastic_%K'], 3, np.add) / 3
+
+    s['Compra'] = ((s['Stochastic_%K'] > s['Stochastic_%D']) & (s['Temu_20'] > close)).astype(int)
+    s['Venta'] = ((s['Stochastic_%K'] < s['Stochastic_%D']) &
+                  (s['Tenkan_sen'] > s['Kijun_sen']) &
+                  (s['Temu_20'] < close)).astype(int)
+    s['Stop_Loss'] = 0.85 * s['Senkou_Span_B']
+    s['Take_profit'] = 1.6 * s['Senkou_Span_A']
+    return s
+
+def backtest_arrays(close, high, low, compra, venta, stop_loss, take_profit, p=0.5, cta_inicial=100.0,
+                    limite=None):
+    """
+    Versión vectorizada de process_trading_logic: recorre las fechas una vez y procesa
+    todos los caminos (columnas) a la vez. Los niveles vacíos (None) se representan con NaN.
+
+    Args:
+        close, high, low, compra, venta, stop_loss, take_profit: Arrays (fechas, caminos).
+        p (float): Porcentaje de la posición que se venderá en take profit.
+        cta_inicial (float): Efectivo inicial.
+        limite: Límite de posición (fechas, caminos) o escalar; None equivale a 1.
+
+    Returns:
+        dict: Arrays (fechas, caminos) de 'cta', 'bolsa', 'Valor' y 'compra2'.
+    """
+    close, high, low, stop_loss, take_profit = (
+        np.asarray(a, dtype=float) for a in (close, high, low, stop_loss, take_profit))
+    compra = np.asarray(compra) == 1
+    venta = np.asarray(venta) == 1
+    forma = np.broadcast_shapes(close.shape, compra.shape, stop_loss.shape)
+    close, high, low, compra, venta, stop_loss, take_profit = (
+        np.broadcast_to(a, forma) for a in (close, high, low, compra, venta, stop_loss, take_profit))
+    if limite is not None:
+        limite = np.broadcast_to(np.asarray(limite, dtype=float), forma)
+
+    historial = {
+        'cta': np.empty(forma), 'bolsa': np.empty(forma),
+        'Valor': np.empty(forma), 'compra2': np.zeros(forma, dtype=bool)
+    }
+    cta = np.full(forma[1:], cta_inicial)
+    bolsa = np.zeros(forma[1:])
+    en_bolsa = np.zeros(forma[1:], dtype=bool)
+    stop_loss_compra = np.full(forma[1:], np.nan)
+    take_profit_compra = np.full(forma[1:], np.nan)
+    historial['cta'][0], historial['bolsa'][0], historial['Valor'][0] = cta, bolsa, cta
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(1, forma[0]):
+            bolsa_anterior = bolsa
+            bolsa = bolsa_anterior * close[i] / close[i - 1]
+            stop_loss_compra = np.where(en_bolsa, stop_loss_compra, np.nan)
+            take_profit_compra = np.where(en_bolsa, take_profit_compra, np.nan)
+
+            # Ramas de process_trading_logic (mutuamente excluyentes)
+            # Una compra solo se ejecuta si hay importe que invertir (efectivo y margen bajo el límite)
+            importe = cta
+            if limite is not None:
+                importe = np.clip(limite[i] * (cta + bolsa_anterior) - bolsa_anterior, 0.0, cta)
+            con_importe = importe > 0
+            ejecuta_compra = compra[i] & con_importe
+            mejora_stop = compra[i] & ~con_importe & (stop_loss[i] > stop_loss_compra)
+            take_profit_alcanzado = ~compra[i] & en_bolsa & (high[i] >= take_profit_compra)
+            venta_total = (~compra[i] & ~take_profit_alcanzado & en_bolsa &
+                           (venta[i] | (low[i] <= stop_loss_compra)))
+
+            # Compra
+            historial['compra2'][i] = ejecuta_compra & ~en_bolsa
+            bolsa = np.where(ejecuta_compra, importe + bolsa_anterior, bolsa)
+            cta = np.where(ejecuta_compra, cta - importe, cta)
+            stop_loss_compra = np.where(ejecuta_compra | mejora_stop, stop_loss[i], stop_loss_compra)
+            take_profit_compra = np.where(ejecuta_compra, take_profit[i], take_profit_compra)
+            en_bolsa = en_bolsa | ejecuta_compra
+
+            # Take profit (venta parcial)
+            cta = np.where(take_profit_alcanzado, cta + p * bolsa, cta)
+            bolsa = np.where(take_profit_alcanzado, (1 - p) * bolsa, bolsa)
+            stop_loss_compra = np.where(take_profit_alcanzado & (stop_loss[i] > stop_loss_compra),
+                                        stop_loss[i], stop_loss_compra)
+            take_profit_compra = np.where(take_profit_alcanzado, take_profit[i], take_profit_compra)
+
+            # Venta total
+            cta = np.where(venta_total, cta + bolsa, cta)
+            bolsa = np.where(venta_total, 0.0, bolsa)
+            stop_loss_compra = np.where(venta_total, np.nan, stop_loss_compra)
+            take_profit_compra = np.where(venta_total, np.nan, take_profit_compra)
+            en_bolsa = en_bolsa & ~venta_total
+
+            historial['cta'][i], historial['bolsa'][i], historial['Valor'][i] = cta, bolsa, cta + bolsa
+
+    return historial
+
 def main():
     # Obtener la fecha actual
     hoy = datetime.now()
@@ -173,9 +437,27 @@ def main():
         print(f"Error al leer el archivo de texto: {e}")
         return
     
+    # Límites de posición calculados por correlaciones.py, si existen
+    limites = None
+    nombre_limites = f"limites_posicion_{fecha_str}.csv"
+    if os.path.exists(nombre_limites):
+        limites = pd.read_csv(nombre_limites, parse_dates=['Date'])
+        print(f"Aplicando límites de posición de {nombre_limites}")
+
+    # Versión del código y parámetros para la caché: cambiar cualquier constante de
+    # este script o los límites de posición invalida los resultados guardados
+    version = cache_resultados.version_codigo(__file__)
+    parametros = {'limites': cache_resultados.hash_archivo(nombre_limites) if limites is not None else None}
+
     # Procesar cada archivo Excel
     for archivo in rutas_archivos:
         try:
+            # Si el archivo no ha cambiado desde que se guardaron sus resultados, no hay nada que hacer
+            marca = cache_resultados.clave('backtest_archivo', manifiesto.hash_archivo(archivo), version, parametros)
+            if cache_resultados.obtener('backtest_archivo', marca) is not None:
+                print(f"Sin cambios en {archivo}, resultados ya guardados.")
+                continue
+
             # Cargar datos
             df = pd.read_excel(archivo, sheet_name='Sheet1')
             
@@ -188,18 +470,27 @@ def main():
                 print(f"Columnas faltantes en {archivo}: {', '.join(faltan_columnas)}")
                 continue
             
-            # Preparar datos
-            df.fillna(0, inplace=True)
-            
-            # Inicializar y procesar el DataFrame
-            kkddb2_df = initialize_dataframe(df)
-            kkddb2_df = process_trading_logic(kkddb2_df)
-            
-            # Redondear valores
-            columns_to_round = ['cta', 'bolsa', 'Stop_Loss', 'Take_profit', 'Valor', 
-                              'compra2', 'ventap', 'Rentabilidad',
-                              'Tenkan_sen', 'Kijun_sen', 'Senkou_Span_A', 'Senkou_Span_B']
-            kkddb2_df[columns_to_round] = kkddb2_df[columns_to_round].round(1)
+            # Consultar la caché antes de repetir el backtest
+            clave = cache_resultados.clave('backtest', cache_resultados.hash_dataframe(df), version, parametros)
+            kkddb2_df = cache_resultados.obtener('backtest', clave)
+            if kkddb2_df is None:
+                # Preparar datos
+                df.fillna(0, inplace=True)
+                
+                # Inicializar y procesar el DataFrame
+                kkddb2_df = initialize_dataframe(df)
+                simbolo = os.path.basename(archivo).split('.')[0]
+                if limites is not None and simbolo in limites.columns:
+                    fechas = pd.to_datetime(kkddb2_df['Date'], errors='coerce')
+                    kkddb2_df['Limite_Posicion'] = fechas.map(limites.set_index('Date')[simbolo]).fillna(1.0).to_numpy()
+                kkddb2_df = process_trading_logic(kkddb2_df)
+                
+                # Redondear valores
+                columns_to_round = ['cta', 'bolsa', 'Stop_Loss', 'Take_profit', 'Valor', 
+                                  'compra2', 'ventap', 'Rentabilidad',
+                                  'Tenkan_sen', 'Kijun_sen', 'Senkou_Span_A', 'Senkou_Span_B']
+                kkddb2_df[columns_to_round] = kkddb2_df[columns_to_round].round(1)
+                cache_resultados.guardar('backtest', clave, kkddb2_df)
             
             # Guardar resultados
             libro = openpyxl.load_workbook(archivo)
@@ -215,6 +506,10 @@ def main():
                 kkddb2_df.to_excel(writer, sheet_name=nombre_nueva_hoja, index=False)
             
             print(f"Resultados guardados en '{nombre_nueva_hoja}' del archivo {archivo}.")
+
+            # Actualizar el manifiesto y marcar el archivo resultante para saltarlo si se vuelve a ejecutar sin cambios
+            marca = cache_resultados.clave('backtest_archivo', manifiesto.registrar_cambio(archivo)['hash'], version, parametros)
+            cache_resultados.guardar('backtest_archivo', marca, nombre_nueva_hoja)
             
         except Exception as e:
             print(f"Error al procesar {archivo}: {e}")
@@ -0,0 +1,238 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import cache_resultados
+
+# -----------------------------------
+# Manifiesto de los ficheros del día: por cada fichero de la carpeta AAAAMMDD guarda
+# tamaño, fecha de modificación, hash del contenido, número de filas, primera y última
+# fecha y el esquema (columnas y tipo) de la hoja Sheet1.
+#
+# Se construye con os.scandir y se actualiza de forma incremental: solo se vuelven a
+# leer los ficheros cuyo tamaño o fecha de modificación han cambiado. 2lista.py y
+# 5lista_indicadores.py lo actualizan y escriben las listas ordenadas de mayor a menor
+# tamaño, para que las etapas empiecen por los ficheros más grandes. Las etapas obtienen
+# de aquí el hash de cada fichero (hash_archivo) sin volver a leerlo si no ha cambiado.
+#
+#   manifiesto_AAAAMMDD.json
+# -----------------------------------
+
+VERSION_MANIFIESTO = 1
+
+# Manifiesto del día cargado en este proceso (ver _manifiesto_actual)
+_actual = None
+
+
+def ruta_manifiesto(fecha=None):
+    return f"manifiesto_{fecha or datetime.today().strftime('%Y%m%d')}.json"
+
+
+def ruta_directorio(directorio):
+    """Manifiesto de una carpeta AAAAMMDD: el de la fecha que da nombre a la carpeta."""
+    return ruta_manifiesto(os.path.basename(os.path.normpath(directorio)))
+
+
+def _clave(ruta):
+    return os.path.normcase(os.path.abspath(ruta))
+
+
+def cargar(ruta=None):
+    """Lee un manifiesto (por defecto, el del día); si no existe devuelve uno vacío."""
+    ruta = ruta or ruta_manifiesto()
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            manifiesto = json.load(archivo)
+        if manifiesto.get('version') == VERSION_MANIFIESTO:
+            return manifiesto
+    return {'version': VERSION_MANIFIESTO, 'archivos': {}}
+
+
+def guardar(manifiesto, ruta=None):
+    ruta = ruta or ruta_manifiesto()
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=1, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _tipo(valor):
+    if isinstance(valor, bool):
+        return 'booleano'
+    if isinstance(valor, (int, float)):
+        return 'numero'
+    if isinstance(valor, datetime):
+        return 'fecha'
+    return 'texto'
+
+
+def _fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d')
+    import pandas as pd
+
+    fecha = pd.to_datetime(valor, errors='coerce')
+    return None if pd.isna(fecha) else fecha.strftime('%Y-%m-%d')
+
+
+def describir_hoja(ruta, hoja='Sheet1'):
+    """
+    Filas, primera y última fecha y esquema de una hoja, leyendo el libro en modo
+    read_only. Reconoce las cabeceras en bruto de yfinance (filas Price/Ticker/Date).
+    """
+    # Importación diferida: las órdenes que solo listan el manifiesto no necesitan openpyxl
+    import openpyxl
+
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        if hoja not in libro.sheetnames:
+            return {'filas': None, 'primera_fecha': None, 'ultima_fecha': None, 'columnas': {}}
+        filas = libro[hoja].iter_rows(values_only=True)
+        cabecera = [str(valor) for valor in next(filas, ())]
+        tipos = {}
+        num_filas = 0
+        primera = ultima = None
+        for fila in filas:
+            # Filas de cabecera adicionales de las descargas en bruto
+            if fila and fila[0] in ('Ticker', 'Date') and num_filas == 0:
+                continue
+            num_filas += 1
+            if fila and fila[0] is not None:
+                if primera is None:
+                    primera = fila[0]
+                ultima = fila[0]
+            if len(tipos) < len(cabecera):
+                for nombre, valor in zip(cabecera, fila):
+                    if valor is not None and nombre not in tipos:
+                        tipos[nombre] = _tipo(valor)
+        return {
+            'filas': num_filas,
+            'primera_fecha': _fecha(primera) if primera is not None else None,
+            'ultima_fecha': _fecha(ultima) if ultima is not None else None,
+            'columnas': {nombre: tipos.get(nombre) for nombre in cabecera}
+        }
+    finally:
+        libro.close()
+
+
+def describir(ruta, estado=None):
+    """Entrada completa del manifiesto para un fichero."""
+    estado = estado or os.stat(ruta)
+    entrada = {
+        'ruta': ruta,
+        'tipo': 'indicadores' if "indicadores" in os.path.basename(ruta) else 'descarga',
+        'tamano': estado.st_size,
+        'mtime_ns': estado.st_mtime_ns,
+        'hash': cache_resultados.hash_archivo(ruta)
+    }
+    try:
+        entrada.update(describir_hoja(ruta) if ruta.endswith('.xlsx') else {})
+    except Exception as e:
+        print(f"⚠️ No se pudo leer {ruta}: {e}")
+    return entrada
+
+
+def _sin_cambios(entrada, estado):
+    return entrada is not None and entrada['tamano'] == estado.st_size and entrada['mtime_ns'] == estado.st_mtime_ns
+
+
+def actualizar(directorio, ruta=None):
+    """
+    Recorre la carpeta con os.scandir y actualiza el manifiesto: reutiliza las entradas
+    de los ficheros con el mismo tamaño y fecha de modificación, describe los nuevos o
+    modificados y elimina los que ya no existen. Por defecto se usa el manifiesto de la
+    fecha de la carpeta (ver ruta_directorio), no el del día.
+
+    Returns:
+        tuple: (manifiesto, número de ficheros descritos de nuevo)
+    """
+    if not os.path.exists(directorio):
+        raise FileNotFoundError(f"El directorio {directorio} no existe.")
+    ruta = ruta or ruta_directorio(directorio)
+    anterior = cargar(ruta)['archivos']
+    archivos = {}
+    descritos = 0
+    for entrada in os.scandir(directorio):
+        if not entrada.is_file():
+            continue
+        clave = _clave(entrada.path)
+        estado = entrada.stat()
+        if _sin_cambios(anterior.get(clave), estado):
+            archivos[clave] = anterior[clave]
+            # La ruta se guarda tal como se escribe en las listas
+            archivos[clave]['ruta'] = entrada.path
+        else:
+            archivos[clave] = describir(entrada.path, estado)
+            descritos += 1
+    manifiesto = {'version': VERSION_MANIFIESTO, 'archivos': archivos}
+    guardar(manifiesto, ruta)
+    if ruta == ruta_manifiesto():
+        # Las etapas que se ejecutan después en el mismo proceso (kkdd.py todo) lo usan
+        global _actual
+        _actual = manifiesto
+    return manifiesto, descritos
+
+
+def rutas(manifiesto, tipo=None):
+    """Rutas del manifiesto (opcionalmente de un tipo), de mayor a menor tamaño."""
+    entradas = [e for e in manifiesto['archivos'].values() if tipo is None or e['tipo'] == tipo]
+    return [e['ruta'] for e in sorted(entradas, key=lambda e: (-e['tamano'], e['ruta']))]
+
+
+def _manifiesto_actual():
+    global _actual
+    if _actual is None:
+        _actual = cargar()
+    return _actual
+
+
+def hash_archivo(ruta):
+    """
+    Hash del contenido de un fichero tomado del manifiesto del día si el fichero no ha
+    cambiado desde que se describió; si no, se calcula.
+    """
+    entrada = _manifiesto_actual()['archivos'].get(_clave(ruta))
+    if _sin_cambios(entrada, os.stat(ruta)):
+        return entrada['hash']
+    return cache_resultados.hash_archivo(ruta)
+
+
+def registrar_cambio(ruta):
+    """
+    Actualiza la entrada de un fichero que una etapa acaba de modificar (p. ej. 3afilas2.py
+    o kkddtemu2.py, que escriben sobre el propio fichero).
+
+    Returns:
+        dict: La nueva entrada del fichero.
+    """
+    entrada = describir(ruta)
+    manifiesto = _manifiesto_actual()
+    manifiesto['archivos'][_clave(ruta)] = entrada
+    if os.path.exists(ruta_manifiesto()):
+        guardar(manifiesto)
+    return entrada
+
+
+def main():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description="Actualiza y muestra el manifiesto de ficheros del día.")
+    parser.add_argument('--directorio', default=hoy, help="Carpeta de los ficheros (por defecto, AAAAMMDD de hoy)")
+    parser.add_argument('--tipo', choices=['descarga', 'indicadores'], help="Mostrar solo un tipo de fichero")
+    args = parser.parse_args()
+
+    try:
+        manifiesto, descritos = actualizar(args.directorio)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    print(f"{ruta_directorio(args.directorio)}: {len(manifiesto['archivos'])} ficheros, {descritos} descritos de nuevo")
+    print(f"{'Fichero':<48} {'KB':>8} {'Filas':>6} {'Primera':>10} {'Última':>10} {'Columnas':>8}")
+    for ruta in rutas(manifiesto, args.tipo):
+        e = manifiesto['archivos'][_clave(ruta)]
+        print(f"{os.path.basename(ruta):<48} {e['tamano'] / 1024:>8.0f} {e.get('filas') or '':>6} "
+              f"{e.get('primera_fecha') or '':>10} {e.get('ultima_fecha') or '':>10} {len(e.get('columnas', {})):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import atexit
+import os
+import pickle
+import secrets
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# -----------------------------------
+# Panel de datos en memoria compartida para trabajos en varios procesos.
+# El proceso principal publica una sola vez los arrays de OHLCV e indicadores de todos
+# los símbolos en un segmento de multiprocessing.shared_memory; los procesos de trabajo
+# se adjuntan al segmento y leen cada columna por símbolo y nombre sin copiarla ni
+# deserializarla. A los procesos solo se les envía el descriptor (nombre del segmento
+# y catálogo de posiciones), no los datos.
+#
+#   with PanelCompartido(tablas) as panel:
+#       resultados = mapear(funcion, panel.descriptor, simbolos, procesos=4)
+#
+# donde funcion(vista, simbolo) es una función de nivel de módulo que lee los datos
+# con vista.columna(simbolo, 'Close') o vista.datos(simbolo).
+#
+# Comparativa con el envío por pickle:
+#   py memoria_compartida.py benchmark --procesos 4
+# -----------------------------------
+
+# Nombre del segmento y catálogo {símbolo: {columna: (posición en bytes, filas, dtype)}}
+DescriptorPanel = namedtuple('DescriptorPanel', ['nombre', 'catalogo'])
+
+# Alineación de cada columna dentro del segmento, en bytes
+ALINEACION = 64
+
+# Vista del panel en cada proceso de trabajo (la adjunta _iniciar_proceso)
+_vista = None
+
+
+def _segmento_existente(nombre):
+    """
+    Adjunta un segmento existente sin registrarlo en el resource_tracker: antes de
+    Python 3.13 el tracker lo eliminaría al terminar el proceso de trabajo, aunque el
+    propietario (el proceso que lo publicó) siga usándolo.
+    """
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        pass
+    registrar = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=nombre)
+    finally:
+        resource_tracker.register = registrar
+
+
+class PanelCompartido:
+    """
+    Publica en memoria compartida un panel {símbolo: {columna: array 1-D}}.
+
+    El segmento se elimina al llamar a cerrar(), al salir del bloque with o, si el
+    proceso termina sin hacerlo, al salir del intérprete.
+    """
+
+    def __init__(self, tablas, nombre=None):
+        catalogo = {}
+        posicion = 0
+        for simbolo, columnas in tablas.items():
+            catalogo[simbolo] = {}
+            for columna, valores in columnas.items():
+                valores = np.asarray(valores)
+                catalogo[simbolo][columna] = (posicion, len(valores), valores.dtype.str)
+                posicion += -(-valores.nbytes // ALINEACION) * ALINEACION
+
+        self._segmento = shared_memory.SharedMemory(
+            name=nombre or f"kkdd_{os.getpid()}_{secrets.token_hex(4)}", create=True, size=max(posicion, 1))
+        self.descriptor = DescriptorPanel(self._segmento.name, catalogo)
+        atexit.register(self.cerrar)
+
+        for simbolo, columnas in tablas.items():
+            for columna, valores in columnas.items():
+                inicio, filas, dtype = catalogo[simbolo][columna]
+                destino = np.ndarray((filas,), dtype=dtype, buffer=self._segmento.buf, offset=inicio)
+                destino[:] = valores
+                del destino
+
+    @property
+    def tamano(self):
+        return self._segmento.size
+
+    def cerrar(self):
+        """Libera y elimina el segmento (los procesos adjuntos dejan de poder abrirlo)."""
+        if self._segmento is None:
+            return
+        atexit.unregister(self.cerrar)
+        segmento, self._segmento = self._segmento, None
+        try:
+            segmento.close()
+        finally:
+            try:
+                segmento.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+class VistaPanel:
+    """
+    Acceso de solo lectura a un panel publicado, sin copias: cada columna es un array
+    de numpy sobre la memoria compartida. Las columnas dejan de ser válidas al cerrar la vista.
+    """
+
+    def __init__(self, descriptor):
+        self.catalogo = descriptor.catalogo
+        self._segmento = _segmento_existente(descriptor.nombre)
+
+    def simbolos(self):
+        return list(self.catalogo)
+
+    def columnas(self, simbolo):
+        return list(self.catalogo[simbolo])
+
+    def columna(self, simbolo, nombre):
+        """Array de solo lectura de una columna de un símbolo."""
+        try:
+            inicio, filas, dtype = self.catalogo[simbolo][nombre]
+        except KeyError:
+            raise KeyError(f"{simbolo}/{nombre} no está en el panel") from None
+        valores = np.ndarray((filas,), dtype=dtype, buffer=self._segmento.buf, offset=inicio)
+        valores.flags.writeable = False
+        return valores
+
+    def datos(self, simbolo, columnas=None):
+        """Diccionario {columna: array} de un símbolo, como el que usan expresiones.py y estrategias.py."""
+        return {nombre: self.columna(simbolo, nombre) for nombre in (columnas or self.catalogo[simbolo])}
+
+    def cerrar(self):
+        if self._segmento is None:
+            return
+        segmento, self._segmento = self._segmento, None
+        try:
+            segmento.close()
+        except BufferError:
+            # Aún quedan columnas en uso: el segmento se libera cuando se recojan
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+def _iniciar_proceso(descriptor):
+    """Inicializador de cada proceso de trabajo: se adjunta al panel una sola vez."""
+    global _vista
+    _vista = VistaPanel(descriptor)
+    atexit.register(_vista.cerrar)
+
+
+def _ejecutar(funcion, argumento):
+    return funcion(_vista, argumento)
+
+
+def mapear(funcion, descriptor, argumentos, procesos=None):
+    """
+    Ejecuta funcion(vista, argumento) para cada argumento en un grupo de procesos que
+    comparten el panel. Con procesos=1 se ejecuta en el proceso actual.
+
+    Returns:
+        list: Resultados en el orden de los argumentos.
+    """
+    argumentos = list(argumentos)
+    if procesos == 1:
+        with VistaPanel(descriptor) as vista:
+            return [funcion(vista, argumento) for argumento in argumentos]
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso, initargs=(descriptor,)) as executor:
+        return list(executor.map(_ejecutar, [funcion] * len(argumentos), argumentos,
+                                 chunksize=max(1, len(argumentos) // (4 * (procesos or os.cpu_count() or 1)))))
+
+
+# -----------------------------------
+# Comparativa con el envío de los datos por pickle
+# -----------------------------------
+
+def panel_sintetico(num_simbolos, filas, num_columnas, semilla=0):
+    """Panel aleatorio con Close y num_columnas - 1 indicadores por símbolo."""
+    rng = np.random.default_rng(semilla)
+    tablas = {}
+    for i in range(num_simbolos):
+        tabla = {'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.01, filas)))}
+        for j in range(num_columnas - 1):
+            tabla[f"Indicador_{j}"] = rng.normal(0, 1, filas)
+        tablas[f"S{i:03d}"] = tabla
+    return tablas
+
+
+def _calculo_benchmark(datos, ventana):
+    """Trabajo de cada tarea: media móvil de todas las columnas con una ventana dada."""
+    total = 0.0
+    for valores in datos.values():
+        acumulado = np.cumsum(valores)
+        total += float(np.nansum(acumulado[ventana:] - acumulado[:-ventana]) / ventana)
+    return total
+
+
+def _tarea_pickle(datos, ventana):
+    return _calculo_benchmark(datos, ventana)
+
+
+def _tarea_compartida(vista, argumento):
+    simbolo, ventana = argumento
+    return _calculo_benchmark(vista.datos(simbolo), ventana)
+
+
+def benchmark(tablas, ventanas, procesos=None):
+    """
+    Ejecuta el mismo barrido (cada símbolo con cada ventana) enviando los datos por
+    pickle en cada tarea y a través del panel compartido.
+
+    Returns:
+        dict: Segundos de cada método, bytes serializados y si los resultados coinciden.
+    """
+    # Las tareas se importan desde el módulo para que funcionen también con spawn
+    from memoria_compartida import _tarea_compartida as tarea_compartida, _tarea_pickle as tarea_pickle
+
+    tareas = [(simbolo, ventana) for simbolo in tablas for ventana in ventanas]
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos) as executor:
+        por_pickle = list(executor.map(tarea_pickle, [tablas[s] for s, _ in tareas], [v for _, v in tareas]))
+    tiempo_pickle = time.perf_counter() - inicio
+    bytes_pickle = sum(len(pickle.dumps(tablas[s], protocol=pickle.HIGHEST_PROTOCOL)) for s, _ in tareas)
+
+    inicio = time.perf_counter()
+    with PanelCompartido(tablas) as panel:
+        compartido = mapear(tarea_compartida, panel.descriptor, tareas, procesos)
+        tamano = panel.tamano
+        bytes_compartido = len(pickle.dumps(panel.descriptor)) + sum(len(pickle.dumps(t)) for t in tareas)
+    tiempo_compartido = time.perf_counter() - inicio
+
+    return {
+        'tareas': len(tareas),
+        'MB_panel': tamano / 1024 / 1024,
+        'segundos_pickle': tiempo_pickle,
+        'segundos_compartido': tiempo_compartido,
+        'MB_serializados_pickle': bytes_pickle / 1024 / 1024,
+        'MB_serializados_compartido': bytes_compartido / 1024 / 1024,
+        'resultados_iguales': bool(np.allclose(por_pickle, compartido, equal_nan=True))
+    }
+
+
+def main():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description="Panel de datos en memoria compartida para trabajos en varios procesos.")
+    parser.add_argument('accion', choices=['benchmark'])
+    parser.add_argument('--lista', help=f"Lista de ficheros de indicadores (p. ej. lista_indicadores_{hoy}.txt); "
+                                        "sin ella se usa un panel sintético")
+    parser.add_argument('--simbolos', type=int, default=35, help="Símbolos del panel sintético")
+    parser.add_argument('--filas', type=int, default=5000, help="Filas por símbolo del panel sintético")
+    parser.add_argument('--columnas', type=int, default=60, help="Columnas por símbolo del panel sintético")
+    parser.add_argument('--ventanas', type=int, nargs='*', default=[5, 10, 20, 50, 100, 200],
+                        help="Ventanas del barrido (una tarea por símbolo y ventana)")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos en paralelo (por defecto, todos los núcleos)")
+    args = parser.parse_args()
+
+    if args.lista:
+        from estrategias import cargar_datos, version_datos
+
+        with open(args.lista, 'r') as file:
+            file_paths = [line.strip() for line in file if line.strip()]
+        version = version_datos()
+        tablas = {os.path.basename(f).split('.')[0]: cargar_datos(f, version) for f in file_paths}
+    else:
+        tablas = panel_sintetico(args.simbolos, args.filas, args.columnas)
+
+    resultado = benchmark(tablas, args.ventanas, args.procesos)
+    print(f"{len(tablas)} símbolos, {resultado['tareas']} tareas, panel de {resultado['MB_panel']:.1f} MB")
+    print(f"{'Método':<12} {'Segundos':>9} {'MB enviados':>12}")
+    print(f"{'pickle':<12} {resultado['segundos_pickle']:>9.2f} {resultado['MB_serializados_pickle']:>12.1f}")
+    print(f"{'compartido':<12} {resultado['segundos_compartido']:>9.2f} {resultado['MB_serializados_compartido']:>12.2f}")
+    print(f"Resultados iguales: {'sí' if resultado['resultados_iguales'] else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
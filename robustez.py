@@ -0,0 +1,167 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from kkddtemu2 import backtest_arrays, calcular_senales_arrays
+
+# -----------------------------------
+# Pruebas de robustez Monte Carlo de la mecánica de kkddtemu2.py.
+# Para cada símbolo se generan miles de caminos de precios remuestreando por bloques
+# los rendimientos del Close (con ruido sobre High/Low), se recalculan señales y
+# backtest de todos los caminos a la vez con arrays y se resumen las distribuciones
+# del valor final, el drawdown máximo y el número de operaciones.
+# Funciona sin conexión, sobre los ficheros de indicadores ya descargados.
+# -----------------------------------
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def remuestrear(high, low, close, num_caminos, bloque=10, ruido=0.25, semilla=None):
+    """
+    Genera caminos de precios por bootstrap de bloques móviles de los rendimientos.
+
+    Cada barra remuestreada conserva la relación High/Close y Low/Close de la barra
+    original de la que procede, ampliada con un ruido positivo proporcional a ese rango.
+
+    Args:
+        high, low, close (numpy.ndarray): Serie histórica del símbolo.
+        num_caminos (int): Número de caminos a generar.
+        bloque (int): Longitud de los bloques de rendimientos.
+        ruido (float): Desviación del ruido relativo sobre el rango High/Low de cada barra.
+        semilla: Semilla del generador aleatorio.
+
+    Returns:
+        tuple: Arrays (fechas, caminos) de high, low y close. El primer Close es el original.
+    """
+    rng = np.random.default_rng(semilla)
+    num_barras = len(close)
+    rendimientos = np.diff(np.log(close))
+    ratio_high = np.maximum(high / close, 1.0)[1:]
+    ratio_low = np.minimum(low / close, 1.0)[1:]
+
+    # Índices de las barras: bloques consecutivos que empiezan en posiciones aleatorias
+    num_bloques = -(-(num_barras - 1) // bloque)
+    inicios = rng.integers(0, len(rendimientos) - bloque + 1, size=(num_bloques, num_caminos))
+    indices = (inicios[:, None, :] + np.arange(bloque)[None, :, None]).reshape(-1, num_caminos)[:num_barras - 1]
+
+    caminos_close = np.empty((num_barras, num_caminos))
+    caminos_close[0] = close[0]
+    caminos_close[1:] = close[0] * np.exp(np.cumsum(rendimientos[indices], axis=0))
+
+    caminos_high = np.empty_like(caminos_close)
+    caminos_low = np.empty_like(caminos_close)
+    caminos_high[0], caminos_low[0] = high[0], low[0]
+    ruido_high = np.abs(rng.normal(0.0, ruido, indices.shape))
+    ruido_low = np.abs(rng.normal(0.0, ruido, indices.shape))
+    caminos_high[1:] = caminos_close[1:] * (1 + (ratio_high[indices] - 1) * (1 + ruido_high))
+    caminos_low[1:] = caminos_close[1:] * np.maximum(1 - (1 - ratio_low[indices]) * (1 + ruido_low), 0.0)
+    return caminos_high, caminos_low, caminos_close
+
+
+def metricas(high, low, close):
+    """
+    Ejecuta señales y backtest sobre arrays (fechas, caminos).
+
+    Returns:
+        dict: Por camino, 'Valor_Final', 'Drawdown_Max' (en %) y 'Operaciones' (entradas en bolsa).
+    """
+    s = calcular_senales_arrays(high, low, close)
+    resultado = backtest_arrays(close, high, low, s['Compra'], s['Venta'], s['Stop_Loss'], s['Take_profit'])
+    valor = resultado['Valor']
+    drawdown = 1 - valor / np.maximum.accumulate(valor, axis=0)
+    return {
+        'Valor_Final': valor[-1],
+        'Drawdown_Max': np.nanmax(drawdown, axis=0) * 100,
+        'Operaciones': resultado['compra2'].sum(axis=0)
+    }
+
+
+def simular_lote(high, low, close, num_caminos, bloque, ruido, semilla):
+    """Genera y evalúa un lote de caminos; es la unidad de trabajo de cada proceso."""
+    return metricas(*remuestrear(high, low, close, num_caminos, bloque, ruido, semilla))
+
+
+def simular(high, low, close, num_caminos=2000, bloque=10, ruido=0.25, semilla=0, procesos=None, lote=250):
+    """
+    Reparte los caminos de un símbolo en lotes y los evalúa en paralelo.
+
+    Returns:
+        dict: Métricas de todos los caminos concatenadas.
+    """
+    # Los procesos hijos importan la tarea desde el módulo (necesario con spawn en Windows)
+    from robustez import simular_lote as tarea
+
+    tamanos = [min(lote, num_caminos - inicio) for inicio in range(0, num_caminos, lote)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+    argumentos = [(high, low, close, tamano, bloque, ruido, s) for tamano, s in zip(tamanos, semillas)]
+
+    if procesos == 1 or len(argumentos) == 1:
+        resultados = [tarea(*a) for a in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            resultados = list(executor.map(tarea, *zip(*argumentos)))
+    return {clave: np.concatenate([r[clave] for r in resultados]) for clave in resultados[0]}
+
+
+def resumir(simbolo, original, simulado):
+    """Resume en filas la distribución de cada métrica junto con el valor del camino real."""
+    filas = []
+    for metrica, valores in simulado.items():
+        fila = {'Variable': simbolo, 'Metrica': metrica, 'Original': float(original[metrica][0]),
+                'Media': np.nanmean(valores), 'Desviacion': np.nanstd(valores)}
+        for percentil, valor in zip(PERCENTILES, np.nanpercentile(valores, PERCENTILES)):
+            fila[f"P{percentil}"] = valor
+        # Posición del camino real dentro de la distribución simulada
+        fila['Percentil_Original'] = np.mean(valores <= fila['Original']) * 100
+        filas.append(fila)
+    filas.append({'Variable': simbolo, 'Metrica': 'Prob_Perdida', 'Original': float(original['Valor_Final'][0] < 100),
+                  'Media': np.mean(simulado['Valor_Final'] < 100)})
+    return filas
+
+
+def main():
+    hoy = datetime.today().strftime('%Y%m%d')
+    parser = argparse.ArgumentParser(description="Pruebas de robustez Monte Carlo de la mecánica de trading.")
+    parser.add_argument('--lista', default=f"lista_indicadores_{hoy}.txt", help="Lista de ficheros de indicadores")
+    parser.add_argument('--caminos', type=int, default=2000, help="Caminos simulados por símbolo")
+    parser.add_argument('--bloque', type=int, default=10, help="Longitud de los bloques del bootstrap")
+    parser.add_argument('--ruido', type=float, default=0.25, help="Ruido relativo sobre el rango High/Low")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos en paralelo (por defecto, todos los núcleos)")
+    parser.add_argument('--salida', default=f"robustez_{hoy}.xlsx", help="Excel de salida")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.lista):
+        print(f"El fichero {args.lista} no existe.")
+        return
+    with open(args.lista, 'r') as file:
+        file_paths = [line.strip() for line in file if line.strip()]
+
+    filas = []
+    for file_path in file_paths:
+        simbolo = os.path.basename(file_path).split('.')[0]
+        try:
+            data = pd.read_excel(file_path, sheet_name='Sheet1', usecols=['High', 'Low', 'Close'])
+            data = data.apply(pd.to_numeric, errors='coerce').dropna()
+            high, low, close = (data[col].to_numpy(dtype=float) for col in ['High', 'Low', 'Close'])
+            original = metricas(high[:, None], low[:, None], close[:, None])
+            simulado = simular(high, low, close, args.caminos, args.bloque, args.ruido,
+                               args.semilla, args.procesos)
+        except Exception as e:
+            print(f"Error al procesar {file_path}: {e}")
+            continue
+        filas.extend(resumir(simbolo, original, simulado))
+        print(f"{simbolo}: valor final mediano {np.median(simulado['Valor_Final']):.1f} "
+              f"(P5 {np.percentile(simulado['Valor_Final'], 5):.1f}, real {original['Valor_Final'][0]:.1f})")
+
+    if filas:
+        pd.DataFrame(filas).round(2).to_excel(args.salida, sheet_name='robustez', index=False)
+        print(f"Resultados guardados en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from kkddtemu2 import nuevo_estado_trading, paso_trading
+
+# -----------------------------------
+# Servicio asyncio de señales en vivo: mantiene en memoria el estado de indicadores
+# y de la posición de cada símbolo, lo actualiza barra a barra y lo expone por HTTP.
+# -----------------------------------
+
+# Ventanas usadas por kkddtemu2.py
+PERIODO_TENKAN = 9
+PERIODO_KIJUN = 26
+PERIODO_SENKOU_B = 52
+PERIODO_STOCHASTIC = 14
+PERIODO_STOCHASTIC_D = 3
+PERIODO_TEMU = 20
+
+COLUMNAS_BARRA = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def nuevo_estado_simbolo():
+    """Crea el estado en memoria de un símbolo: ventanas de precios y posición."""
+    return {
+        'highs': deque(maxlen=PERIODO_SENKOU_B),
+        'lows': deque(maxlen=PERIODO_SENKOU_B),
+        'closes': deque(maxlen=PERIODO_TEMU),
+        'stochastic_k': deque(maxlen=PERIODO_STOCHASTIC_D),
+        'trading': nuevo_estado_trading(),
+        'senal': {},
+        'precio_entrada': None,
+        'ultima_fecha': None,
+        'barras': 0
+    }
+
+
+def _ventana(valores, periodo, funcion):
+    """
+    Aplica una función a las últimas `periodo` observaciones, con la misma
+    semántica que rolling(window=periodo): NaN si faltan datos o hay algún NaN.
+    """
+    if len(valores) < periodo:
+        return math.nan
+    ultimos = list(islice(valores, len(valores) - periodo, len(valores)))
+    if any(math.isnan(v) for v in ultimos):
+        return math.nan
+    return funcion(ultimos)
+
+
+def _media(valores):
+    return sum(valores) / len(valores)
+
+
+def _punto_medio(estado, periodo):
+    """Punto medio (máximo + mínimo) / 2 de los últimos `periodo` High/Low."""
+    return (_ventana(estado['highs'], periodo, max) + _ventana(estado['lows'], periodo, min)) / 2
+
+
+def _a_float(valor):
+    """Convierte un valor del feed a float, usando NaN para vacíos o no numéricos."""
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _a_fecha(valor):
+    """Convierte la fecha de una barra (texto ISO o datetime) a datetime; None si no es válida."""
+    if isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(str(valor).strip())
+    except ValueError:
+        return None
+
+
+def actualizar_simbolo(estado, barra):
+    """
+    Incorpora una barra nueva al estado del símbolo y recalcula de forma incremental
+    Ichimoku, Stochastic, Temu_20, las señales Compra/Venta y la posición.
+
+    Las barras sin fecha válida o con una fecha igual o anterior a la última incorporada
+    (repeticiones del feed, o el replay de días ya cargados desde el histórico) se
+    descartan sin modificar el estado.
+
+    Args:
+        estado (dict): Estado del símbolo creado con nuevo_estado_simbolo.
+        barra (dict): Barra con las claves de COLUMNAS_BARRA.
+
+    Returns:
+        dict: La señal actual del símbolo, o None si la barra se ha descartado.
+    """
+    fecha = _a_fecha(barra.get('Date'))
+    if fecha is None or (estado['ultima_fecha'] is not None and fecha <= estado['ultima_fecha']):
+        return None
+    estado['ultima_fecha'] = fecha
+
+    high = _a_float(barra.get('High'))
+    low = _a_float(barra.get('Low'))
+    close = _a_float(barra.get('Close'))
+    estado['highs'].append(high)
+    estado['lows'].append(low)
+    estado['closes'].append(close)
+
+    # Ichimoku
+    tenkan_sen = _punto_medio(estado, PERIODO_TENKAN)
+    kijun_sen = _punto_medio(estado, PERIODO_KIJUN)
+    senkou_span_a = (tenkan_sen + kijun_sen) / 2
+    senkou_span_b = _punto_medio(estado, PERIODO_SENKOU_B)
+
+    # Temu_20
+    temu_20 = _ventana(estado['closes'], PERIODO_TEMU, _media)
+
+    # Stochastic %K y %D
+    low_min = _ventana(estado['lows'], PERIODO_STOCHASTIC, min)
+    high_max = _ventana(estado['highs'], PERIODO_STOCHASTIC, max)
+    rango = high_max - low_min
+    if rango == 0:
+        stochastic_k = math.nan if close == low_min else math.copysign(math.inf, close - low_min)
+    else:
+        stochastic_k = (close - low_min) / rango * 100
+    estado['stochastic_k'].append(stochastic_k)
+    stochastic_d = _ventana(estado['stochastic_k'], PERIODO_STOCHASTIC_D, _media)
+
+    # Señales (las comparaciones con NaN son falsas, igual que en pandas)
+    compra = int(stochastic_k > stochastic_d and temu_20 > close)
+    venta = int(stochastic_k < stochastic_d and tenkan_sen > kijun_sen and temu_20 < close)
+
+    stop_loss = 0.85 * senkou_span_b
+    take_profit = 1.6 * senkou_span_a
+
+    trading = paso_trading(estado['trading'], {
+        'Close': close, 'High': high, 'Low': low,
+        'Compra': compra, 'Venta': venta,
+        'Stop_Loss': stop_loss, 'Take_profit': take_profit
+    })
+    if trading['Precio_Compra'] is not None:
+        estado['precio_entrada'] = trading['Precio_Compra']
+    elif not trading['en_bolsa']:
+        estado['precio_entrada'] = None
+
+    estado['barras'] += 1
+    estado['senal'] = {
+        'Date': barra.get('Date'),
+        'Close': close,
+        'Compra': compra,
+        'Venta': venta,
+        'Stochastic_%K': stochastic_k,
+        'Stochastic_%D': stochastic_d,
+        'Temu_20': temu_20,
+        'Tenkan_sen': tenkan_sen,
+        'Kijun_sen': kijun_sen,
+        'Senkou_Span_A': senkou_span_a,
+        'Senkou_Span_B': senkou_span_b,
+        'Stop_Loss': stop_loss,
+        'Take_profit': take_profit
+    }
+    return estado['senal']
+
+
+def posicion_simbolo(estado):
+    """Devuelve la posición actual de un símbolo en un formato serializable."""
+    trading = estado['trading']
+    return {
+        'en_bolsa': trading['en_bolsa'],
+        'cta': trading['cta'],
+        'bolsa': trading['bolsa'],
+        'Valor': trading['Valor'],
+        'Precio_Compra': estado['precio_entrada'],
+        'Stop_Loss_Compra': trading['Stop_Loss_Compra'],
+        'Take_profit_Compra': trading['Take_profit_Compra'],
+        'compra2': trading['compra2'],
+        'ventap': trading['ventap'],
+        'Rentabilidad': trading['Rentabilidad']
+    }
+
+
+# -----------------------------------
+# ADAPTADORES DE FEED
+# Un feed es un generador asíncrono que produce tuplas (símbolo, barra).
+# -----------------------------------
+
+async def leer_replay(ruta, retardo=0.0):
+    """
+    Feed de prueba que reproduce un fichero CSV local con las columnas
+    Symbol, Date, Open, High, Low, Close y Volume, ordenado por fecha.
+
+    Args:
+        ruta (str): Ruta del fichero de replay.
+        retardo (float): Segundos de espera entre barras para simular tiempo real.
+    """
+    with open(ruta, 'r', newline='') as archivo:
+        for fila in csv.DictReader(archivo):
+            yield fila['Symbol'], {col: fila.get(col) for col in COLUMNAS_BARRA}
+            await asyncio.sleep(retardo)
+
+
+async def leer_historico(rutas):
+    """
+    Feed con el histórico de los ficheros Excel del pipeline (Sheet1), usado para
+    precalentar el estado de cada símbolo antes de escuchar barras nuevas.
+    """
+    import pandas as pd
+
+    for ruta in rutas:
+        simbolo = os.path.basename(ruta).split('.')[0]
+        try:
+            # La lectura del Excel se hace en otro hilo para no bloquear la API
+            data = await asyncio.to_thread(pd.read_excel, ruta, sheet_name='Sheet1')
+        except Exception as e:
+            print(f"Error al leer el histórico de {ruta}: {e}")
+            continue
+        data['Date'] = data['Date'].astype(str)
+        for barra in data[COLUMNAS_BARRA].to_dict('records'):
+            yield simbolo, barra
+        # Ceder el control para seguir atendiendo peticiones durante la carga
+        await asyncio.sleep(0)
+
+
+async def consumir_feed(servicio, feed):
+    """Aplica al estado del servicio cada barra que llega desde un feed."""
+    async for simbolo, barra in feed:
+        inicio = time.perf_counter()
+        estado = servicio['simbolos'].setdefault(simbolo, nuevo_estado_simbolo())
+        if actualizar_simbolo(estado, barra) is None:
+            servicio['descartadas'] += 1
+            continue
+        servicio['latencia_ms'] = (time.perf_counter() - inicio) * 1000
+        servicio['barras'] += 1
+        servicio['ultima_barra'] = datetime.now().isoformat(timespec='seconds')
+
+
+# -----------------------------------
+# API HTTP
+# -----------------------------------
+
+def _limpiar(valor):
+    """Sustituye NaN e infinitos por None para producir JSON válido."""
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    if isinstance(valor, dict):
+        return {clave: _limpiar(v) for clave, v in valor.items()}
+    return valor
+
+
+def responder(servicio, ruta):
+    """
+    Resuelve una ruta de la API y devuelve (código HTTP, cuerpo).
+
+    Rutas:
+        /senales, /senales/<símbolo>, /posiciones, /posiciones/<símbolo>, /estado
+    """
+    simbolos = servicio['simbolos']
+    partes = [parte for parte in ruta.split('?')[0].split('/') if parte]
+    if not partes or partes == ['estado']:
+        return 200, {
+            'simbolos': len(simbolos),
+            'barras': servicio['barras'],
+            'descartadas': servicio['descartadas'],
+            'latencia_ms': servicio['latencia_ms'],
+            'ultima_barra': servicio['ultima_barra']
+        }
+    if partes[0] not in ('senales', 'posiciones') or len(partes) > 2:
+        return 404, {'error': f"Ruta desconocida: {ruta}"}
+
+    if partes[0] == 'senales':
+        vista = lambda estado: estado['senal']
+    else:
+        vista = posicion_simbolo
+
+    if len(partes) == 2:
+        if partes[1] not in simbolos:
+            return 404, {'error': f"Símbolo desconocido: {partes[1]}"}
+        return 200, vista(simbolos[partes[1]])
+    return 200, {simbolo: vista(estado) for simbolo, estado in sorted(simbolos.items())}
+
+
+async def atender_peticion(servicio, reader, writer):
+    """Atiende una petición HTTP GET mínima y responde en JSON."""
+    try:
+        linea = (await reader.readline()).decode('latin-1').split()
+        # Descartar las cabeceras
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        if len(linea) < 2 or linea[0] != 'GET':
+            codigo, cuerpo = 405, {'error': 'Solo se admite GET'}
+        else:
+            codigo, cuerpo = responder(servicio, linea[1])
+        datos = json.dumps(_limpiar(cuerpo), default=str).encode('utf-8')
+        motivo = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[codigo]
+        writer.write(
+            f"HTTP/1.1 {codigo} {motivo}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(datos)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + datos
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def ejecutar_servicio(feeds, host='127.0.0.1', puerto=8035, socket_unix=None):
+    """
+    Arranca la API y consume los feeds en orden (p. ej. histórico y después replay).
+    El servicio sigue atendiendo peticiones cuando los feeds se agotan.
+    """
+    servicio = {'simbolos': {}, 'barras': 0, 'descartadas': 0, 'latencia_ms': None, 'ultima_barra': None}
+
+    async def manejador(reader, writer):
+        await atender_peticion(servicio, reader, writer)
+
+    if socket_unix:
+        servidor = await asyncio.start_unix_server(manejador, path=socket_unix)
+        print(f"Servicio de señales escuchando en {socket_unix}")
+    else:
+        servidor = await asyncio.start_server(manejador, host, puerto)
+        print(f"Servicio de señales escuchando en http://{host}:{puerto}")
+
+    async with servidor:
+        for feed in feeds:
+            await consumir_feed(servicio, feed)
+        print(f"Feeds consumidos: {servicio['barras']} barras de {len(servicio['simbolos'])} símbolos "
+              f"({servicio['descartadas']} barras repetidas o sin fecha descartadas).")
+        await servidor.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de señales Compra/Venta en vivo.")
+    parser.add_argument('--historico', help="Fichero lista_*.txt con los Excel para precalentar el estado")
+    parser.add_argument('--replay', help="Fichero CSV con barras nuevas (Symbol, Date, Open, High, Low, Close, Volume)")
+    parser.add_argument('--retardo', type=float, default=0.0, help="Segundos entre barras del replay")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8035)
+    parser.add_argument('--socket', help="Ruta de un socket Unix en lugar de TCP")
+    args = parser.parse_args()
+
+    feeds = []
+    if args.historico:
+        with open(args.historico, 'r') as file:
+            feeds.append(leer_historico([line.strip() for line in file if line.strip()]))
+    if args.replay:
+        feeds.append(leer_replay(args.replay, args.retardo))
+
+    try:
+        asyncio.run(ejecutar_servicio(feeds, args.host, args.puerto, args.socket))
+    except KeyboardInterrupt:
+        print("Servicio detenido.")
+
+
+if __name__ == "__main__":
+    main()